@@ -1,4 +1,4 @@
-# pylint: disable = C0103, C0301, W0703, W1203
+# pylint: disable = C0103, C0301, W0703
 
 """The "CS Agreement Closing" is a cloud-based application
 that automates the process of closing bonus agreements by
@@ -12,6 +12,10 @@ from engine import controller as ctrlr
 
 log = logging.getLogger("master")
 
+# seconds to wait for a running instance to finish, so
+# that a request email received meanwhile isn't dropped
+_LOCK_TIMEOUT = 1800
+
 
 def main(args: dict) -> int:
     """Serves as the program entry point
@@ -31,6 +35,7 @@ def main(args: dict) -> int:
         - 1: Program fails during logger configuration.
         - 2: Program fails during the initialization phase.
         - 3: Program fails during the processing or reporting phase.
+        - 4: Program exits since another instance is running or the run lock can't be acquired.
     """
 
     try:
@@ -39,6 +44,16 @@ def main(args: dict) -> int:
         print("CRITICAL: ", str(exc))
         return 1
 
+    try:
+        locked = ctrlr.acquire_run_lock(timeout = _LOCK_TIMEOUT)
+    except Exception as exc:
+        log.critical("Could not open the run lock file: %s", exc)
+        return 4
+
+    if not locked:
+        log.critical("Another instance of the application is already running!")
+        return 4
+
     log.info("=== Initialization ===")
 
     try:
@@ -90,6 +105,6 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-e", "--email_id", required=False, help="Sender email id.")
     ret_code = main(vars(parser.parse_args()))
-    log.info(f"=== System shutdown with return code: {ret_code} ===")
+    log.info("=== System shutdown with return code: %d ===", ret_code)
     logging.shutdown()
     sys.exit(ret_code)
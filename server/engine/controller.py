@@ -1,4 +1,4 @@
-# pylint: disable = C0103, C0123, E0401, E0611, R1711, W0703, W1203
+# pylint: disable = C0103, C0123, E0401, E0611, R1711, W0603, W0703
 
 """The module represents the middle layer in the application
 design. Its main role is to connect the top and bottom layers
@@ -6,26 +6,168 @@ by procedures that facilitate data management and control
 flow between the two layers.
 """
 
-import json
+import atexit
 import logging
+import msvcrt
 import re
+import sqlite3
 import sys
+from contextlib import closing
 from datetime import datetime as dt
-from glob import glob
 from logging import config
-from os import remove
-from os.path import isfile, join, split, splitext
-from typing import Union
-
-import pandas as pd
+from os import remove, scandir
+from os.path import exists, getmtime, join, split
+from shutil import rmtree
+from tempfile import gettempdir
+from time import monotonic, sleep
+from typing import Iterator, Union
+
+import orjson
 import yaml
+from openpyxl import load_workbook
 from pandas import DataFrame
 from win32com.client import CDispatch
 
 from . import mails, report, sap, so01, va02, vbo2
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 log = logging.getLogger("master")
 
+# application data folders
+_BATCH_DIR = join(sys.path[0], "data")
+_TEMP_DIR = join(sys.path[0], "temp")
+_TEMP_DATA_DIR = join(_TEMP_DIR, "data")
+_TEMP_DOC_DIR = join(_TEMP_DIR, "doc")
+_TEMP_REPORT_DIR = join(_TEMP_DIR, "report")
+
+# lock file that prevents concurrent runs of the application components
+_LOCK_PATH = join(gettempdir(), "cs_agreement_closing.lock")
+
+# open stream of the lock file while the run lock is held
+_lock_stream = None
+
+# SAP systems available for connection
+_SAP_SYSTEMS = {
+    "P25": sap.SYS_P25,
+    "Q25": sap.SYS_Q25
+}
+
+# parsed yaml files along with their modification times
+_yaml_cache = {}
+
+# company code value stated in the user message body
+_COCD_RE = re.compile(r"Company code:\s*(?P<cocd>\d{4})", re.I|re.M)
+
+# fields added to the input data by agreement processing
+_RESULT_DTYPES = {
+    "Open_Value": "Float64",
+    "Open_Accruals": "Float64",
+    "Credit_Memo": "Int64",
+    "Message": "string"
+}
+
+
+def _load_yaml(file_path: str) -> dict:
+    """Returns the parsed content of a YAML file.
+    The file is parsed again only if it has been
+    modified since it was last loaded.
+    """
+
+    mtime = getmtime(file_path)
+    cached = _yaml_cache.get(file_path)
+
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(file_path, encoding = "utf-8") as stream:
+        content = yaml.load(stream, Loader = _YamlLoader)
+
+    _yaml_cache[file_path] = (mtime, content)
+
+    return content
+
+def _get_next_file_index(dir_path: str, pattern: str) -> int:
+    """Returns the index following the highest index found in the names
+    of the files stored in a folder. The index is extracted from the first
+    group of the 'pattern' regex that must match the entire file name.
+    """
+
+    name_patt = re.compile(pattern)
+    last_idx = 0
+
+    with scandir(dir_path) as entries:
+        for entry in entries:
+
+            match = name_patt.fullmatch(entry.name)
+
+            if match is not None:
+                last_idx = max(last_idx, int(match.group(1)))
+
+    return last_idx + 1
+
+def _release_run_lock() -> None:
+    """Releases the run lock held by the process."""
+
+    global _lock_stream
+
+    if _lock_stream is None:
+        return
+
+    _lock_stream.seek(0)
+    msvcrt.locking(_lock_stream.fileno(), msvcrt.LK_UNLCK, 1)
+    _lock_stream.close()
+    _lock_stream = None
+
+def acquire_run_lock(timeout: float = 0) -> bool:
+    """Acquires a lock that prevents other instances of the application
+    from running against the same SAP user at the same time. The lock
+    is released automatically on the process exit.
+
+    Params:
+    -------
+    timeout:
+        Number of seconds to wait for another process to release the lock.
+        By default, the procedure returns at once if the lock is held.
+
+    Returns:
+    --------
+    True if the lock is acquired, False if it is held by another process.
+
+    Raises:
+    -------
+    OSError:
+        When the lock file cannot be opened.
+    """
+
+    global _lock_stream
+
+    if _lock_stream is not None:
+        return True
+
+    stream = open(_LOCK_PATH, "a+b")
+    stream.seek(0)
+    deadline = monotonic() + timeout
+
+    while True:
+
+        try:
+            msvcrt.locking(stream.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if monotonic() >= deadline:
+                stream.close()
+                return False
+            sleep(1)
+        else:
+            break
+
+    _lock_stream = stream
+    atexit.register(_release_run_lock)
+
+    return True
 
 def configure_logger() -> None:
     """Configures application logging system,
@@ -36,24 +178,14 @@ def configure_logger() -> None:
 
     cfg_path = join(sys.path[0],"log_config.yaml")
 
-    nth = 0
     date_tag = dt.now().strftime("%Y-%m-%d")
     log_dir = join(sys.path[0], "logs")
 
-    while True:
+    nth = _get_next_file_index(log_dir, rf"{re.escape(date_tag)}_(\d+)\.log")
+    log_name = f"{date_tag}_{str(nth).zfill(3)}.log"
+    log_path = join(log_dir, log_name)
 
-        nth += 1
-        nth_file = str(nth).zfill(3)
-        log_name = f"{date_tag}_{nth_file}.log"
-        log_path = join(log_dir, log_name)
-
-        if not isfile(log_path):
-            break
-
-    with open(cfg_path, encoding = "utf-8") as stream:
-        content = stream.read()
-
-    log_cfg = yaml.safe_load(content)
+    log_cfg = _load_yaml(cfg_path)
     config.dictConfig(log_cfg)
 
     prev_file_handler = log.handlers.pop(1)
@@ -83,10 +215,7 @@ def load_app_config() -> dict:
 
     file_path = join(sys.path[0], "app_config.yaml")
 
-    with open(file_path, encoding = "utf-8") as stream:
-        content = stream.read()
-
-    cfg = yaml.safe_load(content)
+    cfg = _load_yaml(file_path)
 
     log.info("Configuration loaded.")
 
@@ -110,10 +239,7 @@ def load_closing_rules(cocd: str) -> dict:
 
     file_path = join(sys.path[0], "rules.yaml")
 
-    with open(file_path, encoding = "utf-8") as stream:
-        content = stream.read()
-
-    rules = yaml.safe_load(content)[cocd]
+    rules = _load_yaml(file_path)[cocd]
 
     log.info("Rules loaded.")
 
@@ -155,11 +281,9 @@ def get_user_input(msg_cfg: dict, data_cfg: dict, email_id: str) -> Union[dict,
     acc = mails.get_account(user_req["mailbox"], user_req["account"], user_req["server"])
     msg = mails.get_message(acc, email_id)
 
-    doc_dir = join(sys.path[0], "temp", "doc")
-    data_dir = join(sys.path[0], "temp", "data")
-
-    data_path = mails.save_attachments(msg, data_dir, ".xlsm")[0]
-    doc_path = mails.save_attachments(msg, doc_dir, ".pdf")[0]
+    file_paths = mails.save_attachments(msg, {".xlsm": _TEMP_DATA_DIR, ".pdf": _TEMP_DOC_DIR})
+    data_path = file_paths[".xlsm"][0]
+    doc_path = file_paths[".pdf"][0]
 
     log.info("User input fetched.")
 
@@ -168,21 +292,26 @@ def get_user_input(msg_cfg: dict, data_cfg: dict, email_id: str) -> Union[dict,
 
     if attached_doc != expected_doc:
         log.warning(
-            f"The name of the attached document '{attached_doc}' "
-            f"differs form the expected '{expected_doc}' name.")
+            "The name of the attached document '%s' "
+            "differs form the expected '%s' name.",
+            attached_doc, expected_doc)
 
     log.info("Loading excel input data ...")
 
-    data = pd.read_excel(
-        data_path, header = 1,
-        names = ["Agreement", "Attachment"]
-    )
+    # stream the agreement numbers in read-only mode, the header is located
+    # on the second row and the attachment column is never read from the file
+    wbook = load_workbook(data_path, read_only = True, data_only = True, keep_links = False)
+
+    try:
+        rows = wbook.active.iter_rows(min_row = 3, max_col = 1, values_only = True)
+        data = DataFrame({"Agreement": [row[0] for row in rows if row[0] is not None]})
+    finally:
+        wbook.close()
 
-    data.drop("Attachment", axis = 1, inplace = True)
     log.info("Data loaded.")
 
     log.info("Extracting parameters from email body ...")
-    match = re.search(r"Company code:\s*(?P<cocd>\d{4})", msg.text_body, re.I|re.M)
+    match = _COCD_RE.search(msg.text_body)
 
     if match is None:
         raise RuntimeError("The message body contains no company code value!")
@@ -199,10 +328,10 @@ def get_user_input(msg_cfg: dict, data_cfg: dict, email_id: str) -> Union[dict,
         "attachment": doc_path
     }
 
-    log.info(f"User email: '{email}'")
-    log.info(f"Company code: '{cocd}'")
-    log.info(f"PDF attachment: '{doc_path}'")
-    log.info(f"Number of excel entries: {data.shape[0]}")
+    log.info("User email: '%s'", email)
+    log.info("Company code: '%s'", cocd)
+    log.info("PDF attachment: '%s'", doc_path)
+    log.info("Number of excel entries: %d", data.shape[0])
 
     return params
 
@@ -220,11 +349,9 @@ def connect_to_sap(sap_cfg: dict) -> CDispatch:
     represents a SAP session (GuiSession).
     """
 
-    if sap_cfg["system"].upper() == "P25":
-        system = sap.SYS_P25
-    elif sap_cfg["system"].upper() == "Q25":
-        system = sap.SYS_Q25
-    else:
+    system = _SAP_SYSTEMS.get(sap_cfg["system"].upper())
+
+    if system is None:
         raise ValueError("Unrecognized system used!")
 
     log.info("Connecting to SAP ...")
@@ -256,62 +383,209 @@ def _dump_data(data: DataFrame) -> None:
 
     dump_dir = join(sys.path[0], "dump")
     date_stamp = dt.now().strftime("%Y-%m-%d")
-    dump_path = None
-    nth = 1
-
-    while True:
 
-        order = str(nth).zfill(3)
-        dump_name = f"data_{order}_{date_stamp}.pkl"
-        dump_path = join(dump_dir, dump_name)
-        nth += 1
-
-        if not isfile(dump_path):
-            break
+    nth = _get_next_file_index(dump_dir, rf"data_(\d+)_{re.escape(date_stamp)}\.pkl")
+    dump_name = f"data_{str(nth).zfill(3)}_{date_stamp}.pkl"
+    dump_path = join(dump_dir, dump_name)
 
     data.to_pickle(dump_path)
 
     log.info("Data dump created.")
 
-def _compile_batch_path(batch_id: int) -> str:
-    """Compiles path to a batch file."""
-    return join(sys.path[0], "data", f"batch_{str(batch_id).zfill(3)}.json")
+def _compile_batch_name(batch_id: int) -> str:
+    """Compiles name of a data batch."""
+    return f"batch_{str(batch_id).zfill(3)}"
+
+def _compile_meta_path(name: str) -> str:
+    """Compiles path to the file that stores
+    the country parameters of a data batch.
+    """
+    return join(_BATCH_DIR, f"{name}.meta.json")
+
+def _compile_memos_path(name: str) -> str:
+    """Compiles path to the file that stores
+    the credit memo numbers of a data batch,
+    one number per line.
+    """
+    return join(_BATCH_DIR, f"{name}.memos.jsonl")
+
+def _compile_checkpoint_path(name: str) -> str:
+    """Compiles path to the database that stores
+    the workflow items of a data batch that have
+    already been processed.
+    """
+    return join(_BATCH_DIR, f"{name}.checkpoint.db")
+
+def _connect_checkpoint(name: str) -> sqlite3.Connection:
+    """Opens the checkpoint database of a data batch."""
+
+    conn = sqlite3.connect(_compile_checkpoint_path(name))
+
+    # in the WAL mode, each committed row survives
+    # a crash of the process in the middle of a batch
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS processed "
+        "(num INTEGER PRIMARY KEY, result INTEGER NOT NULL)")
+
+    return conn
+
+def load_checkpoint(batch_name: str) -> dict:
+    """Loads the workflow items of a data batch
+    processed before the batch was interrupted.
+
+    Params:
+    -------
+    batch_name:
+        Name of the data batch.
+
+    Returns:
+    --------
+    Credit memo request numbers (int) associated with the
+    processing result: True if the workflow item was processed,
+    False if the item wasn't found.
+    """
+
+    if not exists(_compile_checkpoint_path(batch_name)):
+        return {}
+
+    with closing(_connect_checkpoint(batch_name)) as conn:
+        rows = conn.execute("SELECT num, result FROM processed").fetchall()
+
+    return {num: bool(result) for num, result in rows}
+
+def save_checkpoint(batch_name: str, num: int, result: bool) -> None:
+    """Records a processed workflow item of a data batch.
+
+    Params:
+    -------
+    batch_name:
+        Name of the data batch.
+
+    num:
+        Credit memo request number that identifies the workflow item.
+
+    result:
+        True if the workflow item was processed, False if not found.
+    """
+
+    with closing(_connect_checkpoint(batch_name)) as conn:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO processed (num, result) VALUES (?, ?)",
+                (num, int(result)))
+
+def _migrate_legacy_batches() -> None:
+    """Converts data batches stored in the former single-file format
+    ('batch_NNN.json' holding also the credit memos) into the meta
+    and memos files. A batch whose name is already taken by a batch
+    in the current format is migrated under the next free index.
+    """
+
+    legacy_patt = re.compile(r"batch_\d+\.json")
+
+    with scandir(_BATCH_DIR) as entries:
+        legacy_paths = [
+            entry.path for entry in entries
+            if legacy_patt.fullmatch(entry.name) and entry.is_file()
+        ]
+
+    for legacy_path in legacy_paths:
+
+        with open(legacy_path, "rb") as stream:
+            content = orjson.loads(stream.read())
+
+        name = split(legacy_path)[1][:-len(".json")]
+
+        if exists(_compile_meta_path(name)):
+            nth = _get_next_file_index(_BATCH_DIR, r"batch_(\d+)\.meta\.json")
+            name = _compile_batch_name(nth)
+
+        memos = content.pop("credit_memos", [])
+
+        # the memos are written first as the meta
+        # file marks the batch complete for loading
+        with open(_compile_memos_path(name), "w", encoding = "ascii") as stream:
+            stream.write("".join(f"{memo}\n" for memo in memos))
+
+        with open(_compile_meta_path(name), "wb") as stream:
+            stream.write(orjson.dumps(content, option = orjson.OPT_INDENT_2))
+
+        remove(legacy_path)
+        log.info("Data batch '%s' migrated to '%s'.", split(legacy_path)[1], name)
 
 def _create_batch_file(country: str, cocd: str) -> int:
     """Creates a new batch file."""
 
-    # get last batch index
-    nth = 1
-    file_path = _compile_batch_path(nth)
+    # batches left in the former format keep their indices reserved
+    _migrate_legacy_batches()
 
-    while isfile(file_path):
-        nth += 1
-        file_path = _compile_batch_path(nth)
+    # get last batch index
+    nth = _get_next_file_index(_BATCH_DIR, r"batch_(\d+)\.meta\.json")
+    name = _compile_batch_name(nth)
 
     # create a new batch with index + 1
     new_batch = {
         "country": country,
-        "company_code": cocd,
-        "credit_memos": []
+        "company_code": cocd
     }
 
-    with open(file_path, "w", encoding = "ascii") as stream:
-        json.dump(new_batch, stream)
+    # credit memos are appended to the file as they are created;
+    # the file is created first as the meta file marks the batch
+    # complete for loading
+    with open(_compile_memos_path(name), "w", encoding = "ascii"):
+        pass
+
+    with open(_compile_meta_path(name), "wb") as stream:
+        stream.write(orjson.dumps(new_batch, option = orjson.OPT_INDENT_2))
 
     return nth
 
-def _update_batch_data(batch_id: int, memo: int) -> None:
-    """Updates an existing batch file on a credit memo number."""
+def _update_batch_data(batch_id: int, memos: list) -> None:
+    """Updates an existing batch file on credit memo numbers."""
+
+    file_path = _compile_memos_path(_compile_batch_name(batch_id))
+
+    with open(file_path, "a", encoding = "ascii") as stream:
+        stream.write("".join(f"{memo}\n" for memo in memos))
+
+def iter_data_batches() -> Iterator[tuple]:
+    """Iterates over data batches of credit memo requests.
+    Batch files are read lazily, one batch per iteration.
+
+    Yields:
+    -------
+    A tuple of the batch file name and the file content:
+        "country": Name of the country associated with the batch (str).
+        "company_code": A 4-digit company code of the country (str).
+        "credit_memos": Credit memo requests (list of int).
+    """
+
+    meta_ext = ".meta.json"
+
+    # batches created before the format change would be ignored otherwise
+    _migrate_legacy_batches()
 
-    file_path = _compile_batch_path(batch_id)
-    enc = "ASCII"
+    with scandir(_BATCH_DIR) as entries:
+        for entry in entries:
 
-    with open(file_path, encoding = enc) as stream:
-        content = json.loads(stream.read())
-        content["credit_memos"].append(memo)
+            if not (entry.name.endswith(meta_ext) and entry.is_file()):
+                continue
+
+            name = entry.name[:-len(meta_ext)]
+
+            with open(entry.path, "rb") as stream:
+                content = orjson.loads(stream.read())
 
-    with open(file_path, "w", encoding = enc) as stream:
-        json.dump(content, stream, indent = 4)
+            memos_path = _compile_memos_path(name)
+            content["credit_memos"] = []
+
+            # a batch without the memos file has no memo requests yet
+            if exists(memos_path):
+                with open(memos_path, encoding = "ascii") as stream:
+                    content["credit_memos"] = [int(line) for line in stream if line.strip() != ""]
+
+            yield (name, content)
 
 def load_data_batches() -> dict:
     """Loads data batches of credit memo requests.
@@ -325,18 +599,7 @@ def load_data_batches() -> dict:
             "credit_memos": Credit memo requests (list of int).
     """
 
-    data = {}
-    file_paths = glob(join(sys.path[0], "data", "*.json"))
-
-    for file_path in file_paths:
-        file_name = splitext(split(file_path)[1])[0]
-
-        with open(file_path, encoding = "ASCII") as stream:
-            content = json.loads(stream.read())
-
-        data.update({file_name: content})
-
-    return data
+    return dict(iter_data_batches())
 
 def remove_data_batch(name: str) -> None:
     """Removes a data batch file.
@@ -347,19 +610,24 @@ def remove_data_batch(name: str) -> None:
         Name of the batch file to remove.
     """
 
-    file_path = join(sys.path[0], "data", f"{name}.json")
-
     log.info("Removing data batch file ...")
 
     try:
-        remove(file_path)
+        remove(_compile_meta_path(name))
+        remove(_compile_memos_path(name))
+
+        # the checkpoint exists only if the batch
+        # has been processed, at least partially
+        if exists(_compile_checkpoint_path(name)):
+            remove(_compile_checkpoint_path(name))
+
     except Exception as exc:
         log.error(exc)
         return
 
     log.error("Data batch file removed.")
 
-def finalize_workflow(sess: CDispatch, nums: list) -> None:
+def finalize_workflow(sess: CDispatch, nums: list, batch_name: str = None) -> None:
     """Manages finalization of the agrement closing workfow.
 
     Params:
@@ -370,8 +638,15 @@ def finalize_workflow(sess: CDispatch, nums: list) -> None:
     nums:
         Credit memo request numbers that
         identify the workflow items to confirm.
+
+    batch_name:
+        Name of the data batch the numbers come from. If used,
+        then each processed item is recorded in the batch checkpoint
+        and items recorded by a previous, interrupted run are skipped.
     """
 
+    done = {} if batch_name is None else load_checkpoint(batch_name)
+
     log.info("Starting SO01 ...")
     so01.start(sess)
     log.info("SO01 running.")
@@ -381,20 +656,82 @@ def finalize_workflow(sess: CDispatch, nums: list) -> None:
     for nth, num in enumerate(nums, start = 1):
 
         log.info(
-            f"Processing workflow item ({nth} of "
-            f"{len(nums)}) related to order: {num} ...")
+            "Processing workflow item (%d of %d) "
+            "related to order: %s ...", nth, len(nums), num)
+
+        if num in done:
+            log.info("Workflow item already processed in a previous run.")
+            continue
 
         kwd = str(num)
+        processed = so01.process_workflow(items, kwd)
 
-        if so01.process_workflow(items, kwd):
+        if processed:
             log.info("Workflow item processed.")
         else:
-            log.error(f"Workflow item not found using key: '{kwd}'!")
+            log.error("Workflow item not found using key: '%s'!", kwd)
+
+        if batch_name is not None:
+            save_checkpoint(batch_name, num, processed)
 
     log.info("Closing SO01 ...")
     so01.close()
     log.info("SO01 closed.")
 
+def _compile_output(data: DataFrame, results: list) -> DataFrame:
+    """Merges agreement processing results with the input data.
+    Fields of agreements with no result are left empty.
+    """
+
+    res_data = DataFrame(
+        [{} if res is None else res for res in results],
+        index = data.index, columns = list(_RESULT_DTYPES)
+    )
+
+    return data.join(res_data.astype(_RESULT_DTYPES))
+
+def _update_memo_requests(
+        sess: CDispatch, memo_reqs: list, results: list,
+        approvers: list, att_path: str) -> None:
+    """Updates the parameters of credit memo requests in a single VA02 run.
+    Each request is removed from 'memo_reqs' once processed, so that
+    a repeated call continues with the requests not processed yet.
+    """
+
+    if len(memo_reqs) == 0:
+        return
+
+    log.info("Starting VA02 ...")
+    va02.start(sess)
+    log.info("VA02 running.")
+
+    while len(memo_reqs) != 0:
+
+        idx, memo_num = memo_reqs[0]
+
+        # docs may be attached even if the prev step fails
+        try:
+            log.info("Updating parameters of order %s ...", memo_num)
+            va02.change_sales_order(
+                memo_num, print_invoice = False,
+                approvers = approvers, att_path = att_path)
+            log.info("Order parameters updated.")
+        except Exception as exc:
+            log.exception(exc)
+            err_msg = f"Error changing the sales order! {str(exc)}"
+            results[idx]["Message"] += err_msg
+
+            # restart the transaction since the failed
+            # order may have been left open in the editor
+            va02.close()
+            va02.start(sess)
+
+        memo_reqs.pop(0)
+
+    log.info("Closing VA02 ...")
+    va02.close()
+    log.info("VA02 closed.")
+
 def process_agreements(
         sess: CDispatch, rules: dict, data: DataFrame,
         att_path: str, cocd: str) -> DataFrame:
@@ -435,83 +772,73 @@ def process_agreements(
     approvers = rules["approvers"]
     n_items = data.shape[0]
 
-    # add new fields to input data
-    output = data.assign(
-        Open_Value = pd.NA,
-        Open_Accruals = pd.NA,
-        Credit_Memo = pd.NA,
-        Message = ""
-    )
+    # processing results are buffered per agreement
+    # and merged with the input data at the end
+    results = [None] * n_items
 
     # create a new batch file where credit memo requests will be stored
     batch_idx = _create_batch_file(rules["country"], cocd)
 
-    # settle agreements
-    for row in data.itertuples(index = True):
+    # credit memo requests created by the settlement
+    # along with the positions of their agreements
+    memo_reqs = []
 
-        idx = row.Index
-        agt_num = row.Agreement
+    try:
 
-        log.info(f"--------- Agreement {agt_num} ({idx + 1} of {n_items}) ---------")
+        # settle all agreements in a single VBO2 run
+        vbo2.start(sess)
 
-        try:
+        for idx, agt_num in enumerate(data["Agreement"].to_numpy()):
 
-            vbo2.start(sess)
+            log.info("--------- Agreement %s (%d of %d) ---------", agt_num, idx + 1, n_items)
 
             result = vbo2.settle_agreement(
                 agt_num, thresh,
                 accept_inactive_accs = True
             )
 
-            if result["message_type"] == "I":
-                log.info(result["message"])
-            elif result["message_type"] == "W":
-                log.warning(result["message"])
-            elif result["message_type"] == "E":
-                log.error(result["message"])
+            if result.message_type == "I":
+                log.info(result.message)
+            elif result.message_type == "W":
+                log.warning(result.message)
+            elif result.message_type == "E":
+                log.error(result.message)
 
-            output.loc[idx, "Message"] = result["message"]
-            output.loc[idx, "Credit_Memo"] = result["document_number"]
-            output.loc[idx, "Open_Value"] = result["open_value"]
-            output.loc[idx, "Open_Accruals"] = result["open_accruals"]
+            results[idx] = {
+                "Open_Value": result.open_value,
+                "Open_Accruals": result.open_accruals,
+                "Credit_Memo": result.document_number,
+                "Message": result.message
+            }
 
-            if result["document_number"] is None or result["document_type"] == "credit_memo":
-                log.info("Agreement processed.\n")
-                continue
+            if not (result.document_number is None or result.document_type == "credit_memo"):
+                memo_reqs.append((idx, result.document_number))
 
-            vbo2.close()
+                # the memo request exists in SAP from now on, so it's stored
+                # at once to get finalized even if a later agreement fails
+                _update_batch_data(batch_idx, [result.document_number])
 
-            # docs may be attached even if the prev step fails
-            log.info("Starting VA02 ...")
-            va02.start(sess)
-            log.info("VA02 running.")
+            log.info("Agreement processed.\n")
+
+        vbo2.close()
+        _update_memo_requests(sess, memo_reqs, results, approvers, att_path)
+
+    except Exception as exc:
+        log.exception(exc)
 
+        # memo requests already created in SAP get their parameters
+        # updated even if the settlement of a later agreement fails
+        if len(memo_reqs) != 0:
             try:
-                log.info("Updating order parameters ...")
-                va02.change_sales_order(
-                    result["document_number"], print_invoice = False,
-                    approvers = approvers, att_path = att_path)
-                log.info("Order parameters updated.")
-            except Exception as exc:
-                log.exception(exc)
-                err_msg = f"Error changing the sales order! {str(exc)}"
-                output.loc[idx, "Message"] += err_msg
-            finally:
-                log.info("Closing VA02 ...")
-                va02.close()
-                log.info("VA02 closed.")
-
-            # write the credit memo to a file
-            log.info("Updating the data batch on the credit memo ...")
-            _update_batch_data(batch_idx, result["document_number"])
-            log.info("Data batch successfully updated.")
+                vbo2.close()
+                _update_memo_requests(sess, memo_reqs, results, approvers, att_path)
+            except Exception as upd_exc:
+                log.exception(upd_exc)
 
-        except Exception as exc:
-            log.exception(exc)
-            _dump_data(output)
-            raise RuntimeError(f"Unhandled exception: {str(exc)}") from exc
+        _dump_data(_compile_output(data, results))
+        raise RuntimeError(f"Unhandled exception: {str(exc)}") from exc
 
-        log.info("Agreement processed.\n")
+    output = _compile_output(data, results)
 
     return output
 
@@ -537,9 +864,13 @@ def create_report(data: DataFrame, data_cfg: dict, cocd: str) -> None:
     rep_name = data_cfg["report_name"]
     rep_name = rep_name.replace("$company_code$", cocd)
     rep_name = rep_name.replace("$date$", rep_date)
-    report_dir = join(sys.path[0], "temp", "report")
-    rep_path = join(report_dir, rep_name)
-    report.create(rep_path, data, data_cfg["report_sheet_name"])
+    rep_path = join(_TEMP_REPORT_DIR, rep_name)
+
+    if rep_name.lower().endswith(".csv"):
+        report.create_csv(rep_path, data)
+    else:
+        report.create(rep_path, data, data_cfg["report_sheet_name"])
+
     log.info("Report successfully created.")
 
 def send_notification(cfg_msg: dict, recip: str) -> None:
@@ -559,8 +890,12 @@ def send_notification(cfg_msg: dict, recip: str) -> None:
 
     log.info("Sending user notification ...")
 
-    report_dir = join(sys.path[0], "temp", "report")
-    att_path = glob(join(report_dir, "*.*"))[0]
+    with scandir(_TEMP_REPORT_DIR) as entries:
+        att_path = next((entry.path for entry in entries if entry.is_file()), None)
+
+    if att_path is None:
+        raise FileNotFoundError(f"No report found in folder: {_TEMP_REPORT_DIR}")
+
     notif_path = join(sys.path[0], "notification", "template.html")
 
     with open(notif_path, encoding = "utf-8") as stream:
@@ -584,17 +919,30 @@ def send_notification(cfg_msg: dict, recip: str) -> None:
 def remove_temp_files() -> None:
     """Removes all application temporary files."""
 
-    dir_path = join(sys.path[0], "temp")
-    file_paths = glob(join(dir_path, "**", "*.*"), recursive = True)
+    log.info("Removing temporary files ...")
 
-    if len(file_paths) == 0:
-        log.warning("No temporary files detected!")
-        return
+    with scandir(_TEMP_DIR) as entries:
+        temp_dirs = []
+        temp_entries = []
 
-    log.info("Removing temporary files ...")
+        for entry in entries:
+            if entry.is_dir():
+                temp_dirs.append(entry.path)
+            else:
+                temp_entries.append((entry.path, False))
+
+    # the temp subfolders are kept and only their content is removed,
+    # since on Windows a folder can't be recreated until its pending
+    # removal completes and the next run would miss the folder
+    for dir_path in temp_dirs:
+        with scandir(dir_path) as entries:
+            temp_entries.extend((entry.path, entry.is_dir()) for entry in entries)
 
-    for file_path in file_paths:
+    for entry_path, is_dir in temp_entries:
         try:
-            remove(file_path)
+            if is_dir:
+                rmtree(entry_path)
+            else:
+                remove(entry_path)
         except Exception as exc:
             log.exception(exc)
@@ -11,15 +11,33 @@ from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from os.path import exists, isfile, join, split
+from functools import lru_cache
+from os.path import exists, isfile, join, split, splitext
+from shutil import copyfileobj
 from smtplib import SMTP
 from typing import Union
 
 import exchangelib as xlib
 from exchangelib import (
-    Account, Build, Configuration, Identity,
-    Message, OAuth2Credentials, Version
+    Account, Build, Configuration, FileAttachment,
+    Identity, Message, OAuth2Credentials, Version
 )
+from exchangelib.services import GetAttachment
+
+# company-specific email address format
+_LEDVANCE_RE = re.compile(r"\w+\.\w+@ledvance\.com")
+
+# names of the credentials file parameters
+_CRED_PARAMS = {
+    "Client ID": "client_id",
+    "Client Secret": "client_secret",
+    "Tenant ID": "tenant_id"
+}
+
+# attachments larger than the threshold (bytes)
+# are streamed to a file by chunks of given size
+_STREAM_THRESHOLD = 1 << 20
+_CHUNK_SIZE = 1 << 16
 
 
 # custom message classes
@@ -46,6 +64,7 @@ class UndeliveredError(Exception):
     """Message delivery failes."""
 
 
+@lru_cache(maxsize = 8)
 def _get_credentials(acc_name: str) -> OAuth2Credentials:
     """Returns credentails for a given account."""
 
@@ -56,32 +75,15 @@ def _get_credentials(acc_name: str) -> OAuth2Credentials:
         raise FileNotFoundError(f"Credentials file not found: {cred_path}")
 
     with open(cred_path, encoding = "utf-8") as stream:
-        lines = stream.readlines()
+        lines = stream.read().splitlines()
 
-    params = {
-        "client_id": None,
-        "client_secret": None,
-        "tenant_id": None,
-        "identity": Identity(primary_smtp_address = acc_name)
-    }
-
-    for line in lines:
-
-        if ":" not in line:
-            continue
-
-        tokens = line.split(":")
-        param_name = tokens[0].strip()
-        param_value = tokens[1].strip()
-
-        if param_name == "Client ID":
-            key = "client_id"
-        elif param_name == "Client Secret":
-            key = "client_secret"
-        elif param_name == "Tenant ID":
-            key = "tenant_id"
+    pairs = dict(
+        (name.strip(), val.strip()) for name, val in
+        (line.split(":", 1) for line in lines if ":" in line)
+    )
 
-        params[key] = param_value
+    params = {key: pairs.get(name) for name, key in _CRED_PARAMS.items()}
+    params["identity"] = Identity(primary_smtp_address = acc_name)
 
     # verify loaded parameters
     if params["client_id"] is None:
@@ -124,7 +126,7 @@ def _sanitize_emails(addr: Union[str,list]) -> list:
         validated.append(stripped)
 
         # check if email is Ledvance-specific
-        if re.search(r"\w+\.\w+@ledvance.com", stripped) is None:
+        if _LEDVANCE_RE.search(stripped) is None:
             raise ValueError(f"Invalid email address format: '{stripped}!")
 
     return validated
@@ -245,16 +247,45 @@ def send_message(msg: SmtpMessage, host: str, port: int) -> None:
         When attempt to connect to the SMTP server times out.
     """
 
+    send_messages([msg], host, port)
+
+def send_messages(msgs: list, host: str, port: int) -> None:
+    """Sends messages using a single connection to SMTP server.
+
+    Params:
+    -------
+    msgs:
+        SmtpMessage objects representing the messages to be sent.
+
+    host:
+        Name of the SMTP host server used for message sending.
+
+    port:
+        Number o the SMTP server port.
+
+    Raises:
+    -------
+    UndeliveredError:
+        When any of the messages fails to reach all the required recipients.
+
+    TimeoutError:
+        When attempt to connect to the SMTP server times out.
+    """
+
+    failed_recips = []
+
     with SMTP(host, port, timeout = 30) as smtp_conn:
         smtp_conn.set_debuglevel(0) # off = 0; verbose = 1; timestamped = 2
-        send_errs = smtp_conn.sendmail(msg["From"], msg["To"], msg.as_string())
 
-    if len(send_errs) != 0:
-        failed_recips = ";".join(send_errs.keys())
-        raise UndeliveredError(f"Message undelivered to: {failed_recips}")
+        for msg in msgs:
+            send_errs = smtp_conn.sendmail(msg["From"], msg["To"], msg.as_bytes())
+            failed_recips.extend(send_errs.keys())
+
+    if len(failed_recips) != 0:
+        raise UndeliveredError(f"Message undelivered to: {';'.join(failed_recips)}")
 
-def save_attachments(msg: Message, folder_path: str, ext: str = None) -> list:
-    """Saves message attachments of a specific type to a local file.
+def save_attachments(msg: Message, folder_map: dict) -> dict:
+    """Saves message attachments of specific types to local files.
 
     Params:
     -------
@@ -262,50 +293,79 @@ def save_attachments(msg: Message, folder_path: str, ext: str = None) -> list:
         An exchangelib.Message object
         that represents the email.
 
-    folder_path:
-        Path to the folder where attachments will be stored.
-
-    ext:
-        File extension, that determines which attachments to consider (default None).
-        By default, all attachments will be downloaded, regardless of the file type.
-        If a file extension (e.g. '.pdf') is used, then only attachments having that
-        particular file type will be downloaded.
+    folder_map:
+        File extensions (e.g. '.pdf') that determine which attachments
+        to consider, associated with the paths to the folders where
+        attachments having the particular file type will be stored.
+        Attachments of any other file type are not downloaded.
 
     Returns:
     --------
-    A list of file paths to the stored attachments.
+    File extensions used in 'folder_map' associated
+    with lists of file paths to the stored attachments.
 
     Rasises:
     --------
     FolderNotFoundError:
-        When 'folder_path' argument refers to an non-existitg folder.
+        When 'folder_map' contains a path to an non-existitg folder.
 
     AttachmentSavingError:
         When writing attachemnt data to a file fails.
     """
 
-    if not exists(folder_path):
-        raise FolderNotFoundError(f"Folder does not exist: {folder_path}")
+    for folder_path in folder_map.values():
+        if not exists(folder_path):
+            raise FolderNotFoundError(f"Folder does not exist: {folder_path}")
 
-    file_paths = []
+    file_paths = {ext: [] for ext in folder_map}
+    selected = []
 
+    # dispatch the attachments to the target folders in a single pass
     for att in msg.attachments:
 
-        file_path = join(folder_path, att.name)
-
-        if not (ext is None or file_path.lower().endswith(ext)):
+        if not isinstance(att, FileAttachment):
             continue
 
+        ext = splitext(att.name)[1].lower()
+
+        if ext in folder_map:
+            selected.append((att, ext, join(folder_map[ext], att.name)))
+
+    # small attachments are requested together in a single EWS call,
+    # large ones are streamed to the file in chunks to limit memory use
+    bulk = [item for item in selected if (item[0].size or 0) <= _STREAM_THRESHOLD]
+    streamed = [item for item in selected if (item[0].size or 0) > _STREAM_THRESHOLD]
+
+    if len(bulk) != 0:
+
+        fetched = GetAttachment(account = msg.account).call(
+            items = [att.attachment_id for att, _, _ in bulk],
+            include_mime_content = False,
+            body_type = None,
+            filter_html_content = None,
+            additional_fields = None
+        )
+
+        for (_, _, file_path), content_att in zip(bulk, fetched):
+
+            if isinstance(content_att, Exception):
+                raise AttachmentSavingError(str(content_att)) from content_att
+
+            try:
+                with open(file_path, "wb") as a_file:
+                    a_file.write(content_att.content)
+            except Exception as exc:
+                raise AttachmentSavingError(str(exc)) from exc
+
+    for att, _, file_path in streamed:
         try:
-            with open(file_path, "wb") as a_file:
-                a_file.write(att.content)
+            with att.fp as src, open(file_path, "wb") as a_file:
+                copyfileobj(src, a_file, _CHUNK_SIZE)
         except Exception as exc:
             raise AttachmentSavingError(str(exc)) from exc
 
-        if not isfile(file_path):
-            raise AttachmentSavingError(f"Error writing attachment data to file: {file_path}")
-
-        file_paths.append(file_path)
+    for _, ext, file_path in selected:
+        file_paths[ext].append(file_path)
 
     return file_paths
 
@@ -376,12 +436,15 @@ def get_message(acc: Account, email_id: str) -> Message:
         email_id = f"{email_id}>"
 
     # process
-    emails = acc.inbox.walk().filter(message_id = email_id).only(
+    emails = acc.inbox.filter(message_id = email_id).only(
         "subject", "text_body", "headers", "sender",
         "attachments", "datetime_received", "message_id"
     )
 
-    if emails.count() == 0:
+    # evaluate the query only once
+    found = list(emails[:1])
+
+    if len(found) == 0:
         raise MessageNotFoundError(f"Could not find a message with ID: '{email_id}'!")
 
-    return emails[0]
+    return found[0]
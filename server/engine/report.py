@@ -5,15 +5,49 @@ The module provides an interface for generating
 processing output reports for end users.
 """
 
-from pandas import ExcelWriter, DataFrame, Series
+from itertools import groupby
+
+from numpy import integer
+from pandas import DataFrame, isna, to_datetime, to_numeric
 from xlsxwriter.workbook import Workbook
 from xlsxwriter.worksheet import Worksheet
 from xlsxwriter.format import Format
+from xlsxwriter.utility import xl_col_to_name, xl_range
+
+# format of date and time values, as used by DataFrame.to_excel()
+_DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+
+# format of date and time values written to .csv reports
+_CSV_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# columns containing money amounts
+_MONEY_COLS = ("Open_Value", "Open_Accruals")
+
+# columns containing dates
+_DATE_COLS = ("Valid_From", "Valid_To")
+
+# visual formats of the report sheet
+_FMT_GENERAL = {
+    "align": "center"
+}
+
+_FMT_MONEY = {
+    "num_format": "#,##0.00",
+    "align": "center"
+}
 
-def _get_col_width(vals: Series, col_name: str, add_width: int = 0) -> int:
+_FMT_HEADER = {
+    "align": "center",
+    "bg_color": "#F06B00",
+    "font_color": "white",
+    "bold": True
+}
+
+def _get_col_width(col_name: str, max_len: int, add_width: int = 0) -> int:
     """Returns the width of a column calculated as the maximum number
-    of characters contained in column name and column values plus additional
-    points provided with the 'add_width' argument (default 0 points).
+    of characters contained in column name and column values ('max_len')
+    plus additional points provided with the 'add_width' argument
+    (default 0 points).
     """
 
     alpha = 1 # additional offset factor
@@ -24,124 +58,126 @@ def _get_col_width(vals: Series, col_name: str, add_width: int = 0) -> int:
     if col_name == "Agreement":
         return 11 + add_width
 
-    if col_name in ("Valid_From", "Valid_To"):
+    if col_name in _DATE_COLS:
         return 11 + add_width
 
     if col_name == "Payments":
         return 12 + add_width
 
-    data_vals = vals.astype("string").dropna().str.len()
-    data_vals = list(data_vals)
-    data_vals.append(len(str(col_name)))
-    width = max(data_vals) + alpha + add_width
+    width = max(max_len, len(str(col_name))) + alpha + add_width
 
     return width
 
-def _write_to_excel(wrtr: ExcelWriter, data: DataFrame, sht_name: str) -> Workbook:
+def _cast_columns(data: DataFrame) -> DataFrame:
+    """Returns a copy of the data with money and date columns cast
+    to numeric and datetime types, so that the values are written
+    as native excel numbers and dates without per-value detection.
+    """
+
+    casted = {}
+
+    for col in _MONEY_COLS:
+        if col in data.columns:
+            casted[col] = to_numeric(data[col], errors = "coerce")
+
+    for col in _DATE_COLS:
+        if col in data.columns:
+            casted[col] = to_datetime(data[col], errors = "coerce")
+
+    return data.assign(**casted)
+
+def _write_to_excel(sht: Worksheet, data: DataFrame) -> None:
     """Writes data contained in a DataFrame objet to an excel file."""
 
-    data.columns = data.columns.str.replace("_", " ", regex = False)
-    data.to_excel(wrtr, index = False, sheet_name = sht_name)
+    # underscores in the column names are displayed as spaces
+    # in the header, the data column names are left untouched
+    sht.write_row(0, 0, [str(col).replace("_", " ") for col in data.columns])
 
-    # replace spaces in column names back with underscores
-    # for a better field manupulation further in the code
-    data.columns = data.columns.str.replace(" ", "_", regex = False)
+    # convert the data to rows of plain values at once, replacing
+    # missing values with None that are written as blank cells
+    vals = data.to_numpy(dtype = object)
+    vals[isna(vals)] = None
 
-    return wrtr.book
+    # rows are passed to the workbook directly, bypassing
+    # the per-cell style processing done by DataFrame.to_excel()
+    for row_idx, row in enumerate(vals.tolist(), start = 1):
+        sht.write_row(row_idx, 0, row)
 
 def _generate_formats(report: Workbook) -> dict:
     """Generates formats to apply to the columns of the report sheet."""
 
-    formats = {}
+    formats = {
+        "general": report.add_format(_FMT_GENERAL),
+        "money": report.add_format(_FMT_MONEY),
+        "header": report.add_format(_FMT_HEADER)
+    }
 
-    formats["general"] = report.add_format({
-        "align": "center"
-    })
+    return formats
 
-    formats["money"] = report.add_format({
-        "num_format": "#,##0.00",
-        "align": "center"
-    })
+def _resolve_col(col, col_index: dict) -> int:
+    """Returns the position of a column passed either by position or by name."""
 
-    formats["header"] = report.add_format({
-        "align": "center",
-        "bg_color": "#F06B00",
-        "font_color": "white",
-        "bold": True
-    })
+    if isinstance(col, (int, integer)):
+        return col
 
-    return formats
+    return col_index[col]
 
-def _col_to_rng(data: DataFrame, first_col: str, last_col: str = None, row: int = -1) -> str:
+def _col_to_rng(
+        data: DataFrame, first_col: str, last_col: str = None,
+        row: int = -1, col_index: dict = None) -> str:
     """Generates excel data range notation (e.g. 'A1:D1', 'B2:G2'). If 'last_col' is None,
     then only single-column range will be generated (e.g. 'A:A', 'B1:B1'). if 'row' is '-1',
-    then the generated range will span all the column(s) rows (e.g. 'A:A', 'E:E').
+    then the generated range will span all the column(s) rows (e.g. 'A:A', 'E:E'). Column
+    names are resolved using 'col_index', if provided, rather than the data columns.
     """
 
+    if col_index is None:
+        col_index = {col: idx for idx, col in enumerate(data.columns)}
+
     if row < -1:
         raise ValueError(f"Argument 'row' has incorrect value: {row}")
 
-    if isinstance(first_col, str):
-        first_col_idx = data.columns.get_loc(first_col)
-    elif isinstance(first_col, int):
-        first_col_idx = first_col
-    else:
-        assert False, "Argument 'first_col' has invalid type!"
-
-    first_col_idx += 1
-    prim_lett_idx = first_col_idx // 26
-    sec_lett_idx = first_col_idx % 26
-
-    lett_a = chr(ord('@') + prim_lett_idx) if prim_lett_idx != 0 else ""
-    lett_b = chr(ord('@') + sec_lett_idx) if sec_lett_idx != 0 else ""
-    lett = "".join([lett_a, lett_b])
-
-    if last_col is None:
-        last_lett = lett
-    else:
-
-        if isinstance(last_col, str):
-            last_col_idx =  data.columns.get_loc(last_col)
-        elif isinstance(last_col, int):
-            last_col_idx = last_col
-        else:
-            assert False, "Argument 'last_col' has invalid type!"
-
-        last_col_idx += 1
-        prim_lett_idx = last_col_idx // 26
-        sec_lett_idx = last_col_idx % 26
-
-        lett_a = chr(ord('@') + prim_lett_idx) if prim_lett_idx != 0 else ""
-        lett_b = chr(ord('@') + sec_lett_idx) if sec_lett_idx != 0 else ""
-        last_lett = "".join([lett_a, lett_b])
+    first_col_idx = _resolve_col(first_col, col_index)
+    last_col_idx = first_col_idx if last_col is None else _resolve_col(last_col, col_index)
 
     if row == -1:
-        rng = ":".join([lett, last_lett])
+        rng = ":".join([xl_col_to_name(first_col_idx), xl_col_to_name(last_col_idx)])
     else:
-        rng = ":".join([f"{lett}{row}", f"{last_lett}{row}"])
+        rng = xl_range(row - 1, first_col_idx, row - 1, last_col_idx)
 
     return rng
 
-def _format_header(data: DataFrame, sht: Worksheet, fmt: Format) -> None:
+def _format_header(data: DataFrame, sht: Worksheet, fmt: Format, col_index: dict) -> None:
     """Applies visual formatting to the report header."""
 
-    first_row = _col_to_rng(data,  data.columns[0], data.columns[-1], row = 1)
+    first_row = _col_to_rng(data, data.columns[0], data.columns[-1], row = 1, col_index = col_index)
     sht.conditional_format(first_row, {"type": "no_errors", "format": fmt})
 
-def _format_data(data: DataFrame, sht: Worksheet, formats: dict) -> None:
-    """Applies column-specific visual formats to the report data."""
+def _get_col_widths(data: DataFrame) -> dict:
+    """Returns widths of all data columns. The maximum
+    value lengths are computed for all columns at once.
+    """
 
-    for idx, col in enumerate(data.columns):
+    # on a frame without rows, apply() returns a frame instead of a series
+    if data.empty:
+        return {col: _get_col_width(col, 0) for col in data.columns}
 
-        col_width = _get_col_width(data[col], col)
+    max_lens = data.astype("string").apply(lambda col: col.str.len().max())
+    max_lens = max_lens.fillna(0).astype(int)
 
-        if col in ("Open_Value", "Open_Accruals"):
-            col_fmt = formats["money"]
-        else:
-            col_fmt = formats["general"]
+    return {col: _get_col_width(col, max_lens[col]) for col in data.columns}
 
-        # apply new column format
-        sht.set_column(idx, idx, col_width, col_fmt)
+def _format_data(sht: Worksheet, col_index: dict, widths: dict, fmt_map: dict) -> None:
+    """Applies column-specific visual formats to the report data.
+    Adjacent columns that share the same width and format are
+    formatted at once as a single range of columns.
+    """
+
+    runs = groupby(col_index.items(), key = lambda item: (widths[item[0]], fmt_map[item[0]]))
+
+    for (col_width, col_fmt), cols in runs:
+        col_idxs = [idx for _, idx in cols]
+        sht.set_column(col_idxs[0], col_idxs[-1], col_width, col_fmt)
 
 def create(file_path: str, data: DataFrame, sht_name: str) -> None:
     """Generates an .xlsx report fom the outcome of the agreement closing.
@@ -161,11 +197,58 @@ def create(file_path: str, data: DataFrame, sht_name: str) -> None:
     if not file_path.lower().endswith(".xlsx"):
         raise ValueError("A file path to an .xlsx file is expected!")
 
-    # print all and cleared items to separate sheets of a workbook
-    with ExcelWriter(file_path, engine = "xlsxwriter") as wrtr:
+    data = _cast_columns(data)
 
-        report = _write_to_excel(wrtr, data, sht_name)
-        sht = wrtr.sheets[sht_name]
+    # in the constant memory mode, each row is flushed to the file once
+    # the next row is written, so the memory use doesn't grow with data size
+    report = Workbook(file_path, {
+        "constant_memory": True,
+        "default_date_format": _DATETIME_FORMAT
+    })
+
+    try:
+        sht = report.add_worksheet(sht_name)
         formats = _generate_formats(report)
-        _format_header(data, sht, formats["header"])
-        _format_data(data, sht, formats)
+
+        col_index = {col: idx for idx, col in enumerate(data.columns)}
+
+        fmt_map = {
+            col: formats["money"] if col in _MONEY_COLS else formats["general"]
+            for col in col_index
+        }
+
+        # formats are applied before any data is written
+        # since written rows can't be accessed anymore
+        _format_header(data, sht, formats["header"], col_index)
+        _format_data(sht, col_index, _get_col_widths(data), fmt_map)
+        _write_to_excel(sht, data)
+    finally:
+        report.close()
+
+def create_csv(file_path: str, data: DataFrame) -> None:
+    """Generates a .csv report fom the outcome of the agreement closing.
+
+    The column widths and visual formats are applied
+    to the .xlsx reports only, see create().
+
+    Params:
+    -------
+    file_path:
+        Path to the report file.
+
+    data:
+        Data containing the result of agreement closing.
+    """
+
+    if not file_path.lower().endswith(".csv"):
+        raise ValueError("A file path to a .csv file is expected!")
+
+    data = _cast_columns(data)
+
+    # underscores in the column names are displayed as spaces in the header
+    header = [str(col).replace("_", " ") for col in data.columns]
+
+    data.to_csv(
+        file_path, index = False, header = header,
+        date_format = _CSV_DATETIME_FORMAT
+    )
@@ -5,7 +5,8 @@ connection to the SAP GUI scripting engine.
 """
 
 from os.path import isfile
-from subprocess import Popen, TimeoutExpired
+from subprocess import Popen
+from time import monotonic, sleep
 
 import win32com.client
 from win32ui import FindWindow
@@ -15,6 +16,12 @@ from win32com.client import CDispatch
 SYS_P25 = "OG ERP: P25 Productive SSO"
 SYS_Q25 = "OG ERP: Q25 Quality Assurance SSO"
 
+# delays (in seconds) between attempts to get the SAP GUI object
+_LOGIN_DELAYS = (0, 0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+
+# seconds to wait for SAP Logon to provide the scripting object
+_LOGIN_TIMEOUT = 8
+
 class LoginError(Exception):
     """Raised when logign to the 
     SAP GUI scriptng engine fails.
@@ -57,17 +64,28 @@ def login(system: str) -> CDispatch:
         FindWindow(None, "SAP Logon 750")
     except WinError:
         try:
-            proc = Popen(exe_path)
-            proc.communicate(timeout = 8)
-        except TimeoutExpired:
-            pass # does not impact getting a SapGui reference in next step
+            Popen(exe_path)
         except Exception as exc:
             raise LoginError("Communication with the process failed!") from exc
 
-    try:
-        sap_gui_auto = win32com.client.GetObject("SAPGUI")
-    except Exception as exc:
-        raise LoginError("Could not get the 'SAPGUI' object.") from exc
+    # poll for the scripting object with increasing delays, so that
+    # a running SAP Logon is picked up without waiting for the process;
+    # a slow cold start is polled with the last delay until the deadline
+    deadline = monotonic() + _LOGIN_TIMEOUT
+    nth = 0
+
+    while True:
+
+        sleep(_LOGIN_DELAYS[min(nth, len(_LOGIN_DELAYS) - 1)])
+        nth += 1
+
+        try:
+            sap_gui_auto = win32com.client.GetObject("SAPGUI")
+        except Exception as exc:
+            if monotonic() >= deadline:
+                raise LoginError("Could not get the 'SAPGUI' object.") from exc
+        else:
+            break
 
     engine = sap_gui_auto.GetScriptingEngine
 
@@ -30,13 +30,8 @@ def _get_dialog_text(active_wnd: CDispatch) -> str:
 
     assert active_wnd.type == "GuiModalWindow"
 
-    container_top = active_wnd.children(1)
-    lines = []
-
-    for child in container_top.children:
-        lines.append(child.Text.strip())
-
-    txt = " ".join(lines).strip() + "."
+    lines = active_wnd.children(1).children
+    txt = " ".join(child.Text.strip() for child in lines).strip() + "."
 
     return txt
 
@@ -58,7 +53,9 @@ def _is_popup_dialog(msg: str = None) -> bool:
 def _close_popup_dialog(confirm: bool) -> None:
     """Confirms or declines a pop-up dialog."""
 
-    if _sess.ActiveWindow.Text == "Information":
+    active_wnd = _sess.ActiveWindow
+
+    if active_wnd.Text == "Information":
         if confirm:
             _press_enter()
         else:
@@ -68,13 +65,25 @@ def _close_popup_dialog(confirm: bool) -> None:
 
     btn_caption = "Yes" if confirm else "No"
 
-    for child in _sess.ActiveWindow.Children:
-        for grandchild in child.Children:
-            if grandchild.Type != "GuiButton":
-                continue
-            if btn_caption == grandchild.Text.strip():
-                grandchild.Press()
-                return
+    # standard confirmation dialogs use buttons with fixed
+    # IDs, which are located without scanning the window
+    btn_id = "usr/btnSPOP-OPTION1" if confirm else "usr/btnSPOP-OPTION2"
+    btn = active_wnd.findById(btn_id, False)
+
+    if btn is not None and btn.Text.strip() == btn_caption:
+        btn.Press()
+        return
+
+    # other dialogs are searched for the button by its caption
+    btn = next((
+        grandchild
+        for child in active_wnd.Children
+        for grandchild in child.Children
+        if grandchild.Type == "GuiButton" and grandchild.Text.strip() == btn_caption
+    ), None)
+
+    if btn is not None:
+        btn.Press()
 
 def _set_rejection_reason(val: str) -> None:
     """Enters a rejection reason code in a dialog window
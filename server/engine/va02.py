@@ -5,7 +5,6 @@ activities performed in the VA02 SAP transaction.
 """
 
 import logging
-import inspect
 from os.path import isfile, split
 from win32com.client import CDispatch
 
@@ -72,19 +71,30 @@ def _press_search() -> None:
 
 def _get_tab(name: str) -> CDispatch:
 	"""Returns a GuiTab object from a GuiTabStrip collection."""
-
 	tabs = _user_area.findByName("TAXI_TABSTRIP_HEAD", "GuiTabStrip")
-
 	for tab in tabs.children:
 		if tab.text == name:
 			return tab
-
 	assert False, f"Tab with name '{name}' not found!"
 
-def _is_popup_dialog(msg: str = None) -> bool:
-	"""Checks if the active window is a popup dialog window."""
+def _select_tab(name: str) -> CDispatch:
+	"""Selects a tab from the header GuiTabStrip and returns it."""
 
-	active_wnd = _sess.ActiveWindow
+	# the tab strip is resolved on each call since selecting
+	# a tab invalidates the proxies of all the other tabs
+	tab = _get_tab(name)
+	tab.select()
+
+	return tab
+
+def _is_popup_dialog(msg: str = None, active_wnd: CDispatch = None) -> bool:
+	"""Checks if the active window is a popup dialog window.
+	If 'active_wnd' is None, then the active window is fetched
+	from the session, otherwise the window provided is checked.
+	"""
+
+	if active_wnd is None:
+		active_wnd = _sess.ActiveWindow
 
 	if active_wnd.type == "GuiModalWindow":
 
@@ -112,7 +122,9 @@ def _is_error_message(msg: str = None) -> bool:
 def _close_popup_dialog(confirm: bool) -> None:
 	"""Confirms or delines a pop-up dialog."""
 
-	if _sess.ActiveWindow.text == "Information":
+	active_wnd = _sess.ActiveWindow
+
+	if active_wnd.text == "Information":
 		if confirm:
 			_confirm()
 		else:
@@ -122,14 +134,25 @@ def _close_popup_dialog(confirm: bool) -> None:
 
 	btn_caption = "Yes" if confirm else "No"
 
-	for child in _sess.ActiveWindow.Children:
-		for grandchild in child.Children:
-			if grandchild.Type != "GuiButton":
-				continue
-			if btn_caption != grandchild.text.strip():
-				continue
-			grandchild.Press()
-			return
+	# standard confirmation dialogs use buttons with fixed
+	# IDs, which are located without scanning the window
+	btn_id = "usr/btnSPOP-OPTION1" if confirm else "usr/btnSPOP-OPTION2"
+	btn = active_wnd.findById(btn_id, False)
+
+	if btn is not None and btn.text.strip() == btn_caption:
+		btn.Press()
+		return
+
+	# other dialogs are searched for the button by its caption
+	btn = next((
+		grandchild
+		for child in active_wnd.Children
+		for grandchild in child.Children
+		if grandchild.Type == "GuiButton" and grandchild.text.strip() == btn_caption
+	), None)
+
+	if btn is not None:
+		btn.Press()
 
 def _display_header_details() -> None:
 	"""Press 'Display header details' button."""
@@ -139,20 +162,25 @@ def _display_header_details() -> None:
 
 	_user_area.findByName("BT_HEAD", "GuiButton").press()
 
-def _add_entry(key: str, val: str) -> None:
-	"""Adds entries to the partners."""
-
-	table = _main_wnd.findByName("SAPLV09CGV_TC_PARTNER_OVERVIEW", "GuiTableControl")
-	row_idx = 0
+def _get_free_row_index(table: CDispatch) -> int:
+	"""Returns the index of the first available visible row in the
+	partners, or the number of visible rows if all of them are filled.
+	"""
 
 	for row_idx, row in enumerate(table.rows):
 		# decect next available row by searching
 		# for an empty cell in the Parter column
 		if row.ElementAt(1).text == "":
-			break
+			return row_idx
+
+	return table.VisibleRowCount
 
-	table.Rows(row_idx).ElementAt(0).key = key
-	table.Rows(row_idx).ElementAt(1).text = val
+def _add_entry(table: CDispatch, row_idx: int, key: str, val: str) -> None:
+	"""Adds an entry to a row of the partners."""
+
+	row = table.Rows(row_idx)
+	row.ElementAt(0).key = key
+	row.ElementAt(1).text = val
 
 def _open_order(num: int) -> None:
 	"""Opens an order specified by an order number."""
@@ -169,22 +197,29 @@ def _open_order(num: int) -> None:
 	if _is_error_message():
 		raise RuntimeError(_stat_bar.Text)
 
-	while _is_popup_dialog():
+	# the active window and its text are read
+	# only once per each displayed dialog
+	while True:
+
+		active_wnd = _sess.ActiveWindow
 
-		if _is_popup_dialog("Order is blocked. Please check status details"):
+		if not _is_popup_dialog(active_wnd = active_wnd):
+			break
+
+		msg = _get_dialog_text(active_wnd)
+
+		if "Order is blocked. Please check status details" in msg:
 			_close_popup_dialog(confirm = True)
-		elif _is_popup_dialog("has delivery block"):
+		elif "has delivery block" in msg:
 			_close_popup_dialog(confirm = True)
 		else:
-			msg = _get_dialog_text(_sess.ActiveWindow)
 			raise RuntimeError(msg)
 
 def _toggle_invoice_printing(toggled: bool) -> None:
 	"""Toggles printing of invoices."""
 
 	_display_header_details()
-	_get_tab("Billing Document").select()
-	bill_doc = _get_tab("Billing Document")
+	bill_doc = _select_tab("Billing Document")
 	subs_inv_process = bill_doc.findByName("VBKD-MRNKZ", "GuiCheckBox")
 	subs_inv_process.selected = not toggled
 
@@ -192,10 +227,33 @@ def _add_approvers(user_ids: list) -> None:
 	"""Adds approvers to the list of partners."""
 
 	_display_header_details()
-	_get_tab("Partners").select()
+	_select_tab("Partners")
+
+	tbl_name = "SAPLV09CGV_TC_PARTNER_OVERVIEW"
+	table = _main_wnd.findByName(tbl_name, "GuiTableControl")
+
+	# the partners table is scanned only once, the
+	# approvers then fill the following rows in order
+	start_idx = _get_free_row_index(table)
+
+	# rows are addressed relative to the first visible row, so the table
+	# is scrolled down while the approvers don't fit below the free row
+	while start_idx + len(user_ids) > table.VisibleRowCount:
+
+		scrollbar = table.verticalScrollbar
+		prev_pos = scrollbar.Position
+		scrollbar.Position = prev_pos + max(start_idx, 1)
+
+		# scrolling is a round trip, so the table is resolved again
+		table = _main_wnd.findByName(tbl_name, "GuiTableControl")
+
+		if table.verticalScrollbar.Position == prev_pos:
+			raise RuntimeError("Not enough rows in the partners to add the approvers!")
+
+		start_idx = _get_free_row_index(table)
 
 	for nth, usr_id in enumerate(user_ids, start = 1):
-		_add_entry(f"Y{nth}", usr_id)
+		_add_entry(table, start_idx + nth - 1, f"Y{nth}", usr_id)
 
 def _attach_file(file_path: str) -> None:
 	"""Attaches a file to an existing agreement."""
@@ -346,12 +404,7 @@ def change_sales_order(
 		raise ValueError(f"Invalid order number used: {num}!")
 
 	# ensure that at least one arg is not None
-	frame = inspect.currentframe()
-	args, _, _, vals = inspect.getargvalues(frame)
-	args.remove("num")
-	unbound = [vals[a] is None for a in args]
-
-	if all(unbound):
+	if print_invoice is None and approvers is None and att_path is None:
 		return
 
 	_open_order(num)
@@ -417,8 +470,7 @@ def get_printing_status(num: int) -> bool:
 
 	_open_order(num)
 	_display_header_details()
-	_get_tab("Billing Document").select()
-	bill_doc = _get_tab("Billing Document")
+	bill_doc = _select_tab("Billing Document")
 	subs_inv_process = bill_doc.findByName("VBKD-MRNKZ", "GuiCheckBox")
 	checked = subs_inv_process.selected
 	_decline()
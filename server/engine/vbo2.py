@@ -5,14 +5,28 @@ activities performed in the VBO2 SAP transaction.
 """
 
 import logging
-from time import sleep
+from time import monotonic, sleep
+from typing import Callable
 from win32com.client import CDispatch
 
-_sess = None
-_main_wnd = None
-_stat_bar = None
-_tool_bar = None
-_menu_bar = None
+# session used by the module-level procedures
+_session = None
+
+# status bar message keywords and the message types
+# under which they're reported, in the order of checking
+_STATUS_KEYWORDS = (
+    ("Only display is possible", "W"),
+    ("does not exist", "E"),
+    ("cannot be processed", "E"),
+    ("already being processed", "E")
+)
+
+# seconds to wait for a saved agreement to finish processing
+_REOPEN_TIMEOUT = 30.0
+
+# removes thousands separators and replaces decimal
+# commas in amounts formatted by SAP (e.g. '1.234,56')
+_SAP_NUM_TRANS = str.maketrans({".": None, ",": "."})
 
 _log = logging.getLogger("master")
 
@@ -22,88 +36,38 @@ class TransactionClosedError(Exception):
     procedure before starting the transaction.
     """
 
-def _press_cancel() -> None:
-    """Simulates pressing the 'F12' key."""
-    _main_wnd.sendVkey(12)
-
-def _press_save() -> None:
-    """Simulates pressing 'Ctrl and S' keys."""
-    _main_wnd.sendVkey(11)
-
-def _press_back() -> None:
-    """Simulates pressing the 'F3' key."""
-    _main_wnd.sendVkey(3)
-
-def _press_enter() -> None:
-    """Simulates pressing the 'Enter' key."""
-    _main_wnd.sendVkey(0)
+class SettleResult:
+    """Result of settling an agreement."""
+
+    __slots__ = (
+        "open_value",
+        "open_accruals",
+        "document_number",
+        "document_type",
+        "message",
+        "message_type"
+    )
+
+    def __init__(self) -> None:
+        self.open_value = None
+        self.open_accruals = None
+        self.document_number = None
+        self.document_type = None
+        self.message = None
+        self.message_type = None
+
+    def as_dict(self) -> dict:
+        """Returns the result as a dict keyed by the attribute names."""
+        return {attr: getattr(self, attr) for attr in self.__slots__}
 
 def _get_dialog_text(active_wnd: CDispatch) -> str:
     """Returns the text displayed by a pop-up dialog window."""
 
     assert active_wnd.type == "GuiModalWindow"
 
-    container_top = active_wnd.children(1)
-    lines = []
-
-    for child in container_top.children:
-        lines.append(child.Text.strip())
-
-    return " ".join(lines).strip() + "."
-
-def _is_popup_dialog(msg: str = None) -> bool:
-    """Checks if the active window is a popup dialog window."""
-
-    active_wnd = _sess.ActiveWindow
-
-    if active_wnd.type == "GuiModalWindow":
+    lines = active_wnd.children(1).children
 
-        if msg is None:
-            return True
-
-        if msg in _get_dialog_text(active_wnd):
-            return True
-
-    return False
-
-def _close_popup_dialog(confirm: bool) -> None:
-    """Confirms or declines a pop-up dialog."""
-
-    if _sess.ActiveWindow.Text == "Information":
-        if confirm:
-            _press_enter()
-        else:
-            _press_cancel()
-
-        return
-
-    btn_caption = "Yes" if confirm else "No"
-
-    for child in _sess.ActiveWindow.Children:
-        for grandchild in child.Children:
-            if grandchild.Type != "GuiButton":
-                continue
-            if btn_caption == grandchild.Text.strip():
-                grandchild.Press()
-                return
-
-def _set_agreement_number(val: str) -> None:
-    """Enters a value into the 'Agreement number'
-    field located on the VBO02 initial window
-    """
-    _main_wnd.FindByName("RV13A-KNUMA_BO", "GuiCTextField").Text = val
-
-def _clear_input_field() -> None:
-    """Clears 'Agreement number' field value."""
-    _set_agreement_number("")
-
-def _press_settle() -> None:
-    """Press the 'Settle' button."""
-    _tool_bar.FindById("btn[19]").press()
-
-def _display_sales_volume() -> None:
-    """Displays sales volumes by pressing the 'Sum' button."""
-    _tool_bar.FindById("btn[17]").press()
+    return " ".join(child.Text.strip() for child in lines).strip() + "."
 
 def _convert_amount(num: str) -> float:
     """Converts amount in SAP string
@@ -113,14 +77,12 @@ def _convert_amount(num: str) -> float:
     stripped = num.strip()
     coeff = 1
 
-    if num.endswith("-"):
-        stripped = stripped.strip("-")
+    # negative amounts have the minus sign trailing
+    if stripped.endswith("-"):
+        stripped = stripped[:-1]
         coeff = -1
 
-    repl_a = stripped.replace(".", "")
-    repl_b = repl_a.replace(",", ".")
-
-    conv = float(repl_b) * coeff
+    conv = float(stripped.translate(_SAP_NUM_TRANS)) * coeff
 
     return conv
 
@@ -144,456 +106,671 @@ def _get_column_index(tbl: CDispatch, name: str) -> int:
 def _exists_unchecked(tbl: CDispatch, col_idx: int) -> bool:
     """Checks if there's any active agreement condition."""
 
-    if tbl.GetCell(0, 0).Text == "":
+    get_cell = tbl.GetCell
+
+    if get_cell(0, 0).Text == "":
         return False
 
-    for row_idx in range(0, tbl.VisibleRowCount):
-        chkbox = tbl.GetCell(row_idx, col_idx)
-        if not chkbox.Selected:
+    # rows past the end of the table data aren't checked
+    n_rows = min(tbl.RowCount, tbl.VisibleRowCount)
+
+    for row_idx in range(0, n_rows):
+        if not get_cell(row_idx, col_idx).Selected:
             return True
 
     return False
 
-def _get_accounting_document(root: CDispatch, node: CDispatch, keyword: str) -> int:
+def _get_accounting_document(tree: CDispatch, keyword: str) -> int:
     """Returns the number of an agreement credit memo."""
 
-    text = root.GetItemText(node, "COL0")
-
-    if keyword in text:
-        num = text.split(" ")[-1]
-        return int(num)
+    # the node keys are fetched at once in the display
+    # order and the walk ends on the first matching node
+    for node in tree.GetAllNodeKeys():
 
-    if root.GetSubNodesCol(node) is None:
-        return None
+        text = tree.GetItemText(node, "COL0")
 
-    try:
-        next_node = root.GetNextNodeKey(node)
-    except Exception:
-        subnode = root.GetSubNodesCol(node)[0]
-        return _get_accounting_document(root, subnode, keyword)
+        if keyword in text:
+            num = text.split(" ")[-1]
+            return int(num)
 
-    return _get_accounting_document(root, next_node, keyword)
+    return None
 
-def _reopen_agreement() -> None:
-    """Reopens agreement that has
-    previously been processed.
+def _wait_while(
+        predicate: Callable[[], bool], action: Callable[[], None] = None,
+        initial: float = 0.1, factor: float = 2.0, cap: float = 2.0,
+        timeout: float = 60.0, action_interval: float = 0.0) -> bool:
+    """Waits while a condition holds. The condition is re-checked with
+    delays growing from 'initial' by 'factor' up to 'cap' seconds, so
+    that short waits end almost at once. The optional 'action' is called
+    before a delay, at most once per 'action_interval' seconds. Returns
+    True once the condition no longer holds, False if it still holds
+    after 'timeout' seconds.
     """
 
-    _press_enter()
+    deadline = monotonic() + timeout
+    last_action = None
+    delay = initial
 
-    while "being processed" in _stat_bar.text:
-        _press_enter()
-        sleep(2)
+    while predicate():
 
-    if _is_popup_dialog("is marked for deletion"):
-        _close_popup_dialog(confirm = True)
+        now = monotonic()
 
-def _get_document_number(doc_type: str) -> tuple:
-    """Returns the number of accounting
-    document for an agreement.
+        if now >= deadline:
+            return False
+
+        if action is not None:
+            if last_action is None or now - last_action >= action_interval:
+                action()
+                last_action = now
+
+        sleep(delay)
+        delay = min(delay * factor, cap)
+
+    return True
+
+class Vbo2Session:
+    """Automates VBO2 in a single SAP GUI session. All the references
+    to the session windows are held by the instance, so that separate
+    sessions don't share any state.
+
+    The transaction is started by start() and closed by close(),
+    or by using the instance as a context manager.
     """
 
-    # click rebate payments button
-    _menu_bar.FindById("menu[3]/menu[3]").select()
+    def __init__(self, sess: CDispatch) -> None:
 
-    if "No rebate credit memos exist" in _stat_bar.text:
-        return (None, _stat_bar.text)
+        if sess is None:
+            raise UnboundLocalError("Argument 'sess' is unbound!")
 
-    dialog = _sess.FindById("wnd[1]")
-    dialog.FindById("tbar[0]/btn[0]").press()
-    docs = _sess.FindById("wnd[2]")
-    menu_tree = docs.findByName("shell", "GuiShell")
+        self._sess = sess
+        self._main_wnd = sess.FindById("wnd[0]")
+        self._stat_bar = self._main_wnd.FindById("sbar")
+        self._tool_bar = self._main_wnd.FindById("tbar[1]")
+        self._menu_bar = self._main_wnd.FindById("mbar")
+        self._send_vkey = self._main_wnd.sendVkey
+        self._running = False
 
-    if doc_type == "request":
-        kwd = "Credit memo requests"
-    elif doc_type == "memo":
-        kwd = "Rebate credit memo "
+        # whether VBO2 has to be restarted
+        # before processing the next agreement
+        self._needs_hard_reset = False
 
-    num = _get_accounting_document(menu_tree, menu_tree.TopNode, kwd)
+    def __enter__(self) -> "Vbo2Session":
+        self.start()
+        return self
 
-    while _is_popup_dialog():
-        _press_cancel()
+    def __exit__(self, *exc_info) -> None:
+        self.close()
 
-    return (num, "")
+    def _press_cancel(self) -> None:
+        """Simulates pressing the 'F12' key."""
+        self._send_vkey(12)
 
-def _go_to_start_window() -> None:
-    """Displays the initial window."""
+    def _press_save(self) -> None:
+        """Simulates pressing 'Ctrl and S' keys."""
+        self._send_vkey(11)
 
-    # NOTE: restarting the VBO2 is required
-    # in order to reset the object references.
-    # Not doing so would result in runtime
-    # erros or unspecified VBO2 behavior.
+    def _press_back(self) -> None:
+        """Simulates pressing the 'F3' key."""
+        self._send_vkey(3)
 
-    _press_cancel()
-    _sess.StartTransaction("VBO2")
+    def _press_enter(self) -> None:
+        """Simulates pressing the 'Enter' key."""
+        self._send_vkey(0)
 
-def _find(
-        num: int, accept_inactive_accs: bool,
-        accept_outdated_vols: bool) -> tuple:
-    """Finds and opens an agreementbased on
-    its agreement number.
-    """
+    def _is_popup_dialog(self, msg: str = None) -> bool:
+        """Checks if the active window is a popup dialog window."""
 
-    _set_agreement_number(str(num))
-    _press_enter()
+        active_wnd = self._sess.ActiveWindow
 
-    # handle popup dialogs
-    if _is_popup_dialog("is marked for deletion"):
-        _close_popup_dialog(confirm = True)
+        if active_wnd.type == "GuiModalWindow":
 
-        if not accept_inactive_accs:
-            _press_cancel()
-            return _get_dialog_text(_sess.ActiveWindow)
+            if msg is None:
+                return True
 
-    elif _is_popup_dialog("is not current"):
-        _close_popup_dialog(confirm = True)
+            if msg in _get_dialog_text(active_wnd):
+                return True
 
-        if not accept_outdated_vols:
-            _go_to_start_window()
-            return _get_dialog_text(_sess.ActiveWindow)
+        return False
 
-    # handle status bar messages
-    messages = {
+    def _close_popup_dialog(self, confirm: bool) -> None:
+        """Confirms or declines a pop-up dialog."""
 
-        "W": [
-            "Only display is possible"
-        ],
+        active_wnd = self._sess.ActiveWindow
 
-        "E": [
-            "does not exist",
-            "cannot be processed",
-            "already being processed"
-        ]
-    }
+        if active_wnd.Text == "Information":
+            if confirm:
+                self._press_enter()
+            else:
+                self._press_cancel()
 
-    status_msg = _stat_bar.Text
+            return
 
-    for msg_type, kwds in messages.items():
-        for kwd in kwds:
+        btn_caption = "Yes" if confirm else "No"
 
-            if kwd not in status_msg:
-                continue
+        # standard confirmation dialogs use buttons with fixed
+        # IDs, which are located without scanning the window
+        btn_id = "usr/btnSPOP-OPTION1" if confirm else "usr/btnSPOP-OPTION2"
+        btn = active_wnd.findById(btn_id, False)
 
-            return (msg_type, status_msg)
+        if btn is not None and btn.Text.strip() == btn_caption:
+            btn.Press()
+            return
 
-    return ("I", "Agreement found and opened.")
+        # other dialogs are searched for the button by its caption
+        btn = next((
+            grandchild
+            for child in active_wnd.Children
+            for grandchild in child.Children
+            if grandchild.Type == "GuiButton" and grandchild.Text.strip() == btn_caption
+        ), None)
 
-def _get_sales_volumes() -> tuple:
-    """Returns a tuple of sales volumes of an agreement."""
+        if btn is not None:
+            btn.Press()
 
-    _display_sales_volume()
+    def _set_agreement_number(self, val: str) -> None:
+        """Enters a value into the 'Agreement number'
+        field located on the VBO02 initial window
+        """
+        # the field is looked up on each use, since the initial window
+        # is redisplayed by a round trip when no agreement is opened
+        self._main_wnd.FindByName("RV13A-KNUMA_BO", "GuiCTextField").Text = val
 
-    if _is_popup_dialog("is marked for deletion"):
-        _close_popup_dialog(confirm = True)
+    def _clear_input_field(self) -> None:
+        """Clears 'Agreement number' field value."""
+        self._set_agreement_number("")
 
-    _scroll_to_bottom(_main_wnd.FindById("usr"))
+    def _press_settle(self) -> None:
+        """Press the 'Settle' button."""
+        self._tool_bar.FindById("btn[19]").press()
 
-    color_yellow = 3
-    vals = {}
+    def _display_sales_volume(self) -> None:
+        """Displays sales volumes by pressing the 'Sum' button."""
+        self._tool_bar.FindById("btn[17]").press()
 
-    for lbl in _main_wnd.findAllByName("", "GuiLabel"):
+    def _reopen_agreement(self) -> bool:
+        """Reopens agreement that has
+        previously been processed.
 
-        if lbl.ColorIndex != color_yellow:
-            continue
-        if lbl.ColorIntensified:
-            continue
-        if lbl.Text.strip() == "":
-            continue
-        if lbl.Text.isalpha():
-            continue
+        Returns True if the agreement is reopened, False if
+        it is still being processed when the wait times out.
+        """
 
-        vals.update({lbl.Id: lbl.Text.strip()})
+        self._press_enter()
 
-    _press_cancel()
+        # SAP GUI Scripting raises no status bar events to the client,
+        # so the status bar is polled with delays capped at 0.25 s;
+        # each 'Enter' is a dialog step, so it's sent only every 2 s
+        if not _wait_while(
+                lambda: "being processed" in self._stat_bar.text,
+                self._press_enter, cap = 0.25, timeout = _REOPEN_TIMEOUT,
+                action_interval = 2.0):
+            return False
 
-    total = _convert_amount(list(vals.values())[0])
-    accruals = _convert_amount(list(vals.values())[-1])
+        if self._is_popup_dialog("is marked for deletion"):
+            self._close_popup_dialog(confirm = True)
 
-    return (total, accruals)
+        return True
 
-def _scales_checked() -> bool:
-    """Checks if scales are marked for all
-    agreement conditions available. Returns
-    True, if all condition scales are checked.
-    """
+    def _get_document_number(self, doc_type: str) -> tuple:
+        """Returns the number of accounting
+        document for an agreement.
+        """
+
+        # click rebate payments button
+        self._menu_bar.FindById("menu[3]/menu[3]").select()
 
-    for btn in _tool_bar.Children:
-        if btn.Text == "Conditions":
-            btn.press()
-            break
+        if "No rebate credit memos exist" in self._stat_bar.text:
+            return (None, self._stat_bar.text)
 
-    conditions = _sess.FindById("wnd[1]/usr/cntlCUSTOM_CONTAINER/shellcont/shell")
-    condition_key = "SalOrg/SalOff/CustHier/Usage"
-    row_idx = 0
+        dialog = self._sess.FindById("wnd[1]")
+        dialog.FindById("tbar[0]/btn[0]").press()
+        docs = self._sess.FindById("wnd[2]")
+        menu_tree = docs.findByName("shell", "GuiShell")
 
-    while row_idx < conditions.RowCount:
+        if doc_type == "request":
+            kwd = "Credit memo requests"
+        elif doc_type == "memo":
+            kwd = "Rebate credit memo "
 
-        key_comb = conditions.GetCellValue(row_idx, "GSTXT")
+        num = _get_accounting_document(menu_tree, kwd)
 
-        if key_comb != condition_key:
-            row_idx += 1
-            continue
+        while self._is_popup_dialog():
+            self._press_cancel()
+
+        return (num, "")
+
+    def _go_to_start_window(self) -> None:
+        """Displays the initial window."""
+
+        # NOTE: restarting the VBO2 is required
+        # in order to reset the object references.
+        # Not doing so would result in runtime
+        # erros or unspecified VBO2 behavior.
+
+        self._press_cancel()
+        self._sess.StartTransaction("VBO2")
+
+    def _find(
+            self, num: int, accept_inactive_accs: bool,
+            accept_outdated_vols: bool) -> tuple:
+        """Finds and opens an agreementbased on
+        its agreement number.
+        """
+
+        self._set_agreement_number(str(num))
+        self._press_enter()
+
+        # handle popup dialogs
+        if self._is_popup_dialog("is marked for deletion"):
+            self._close_popup_dialog(confirm = True)
+
+            if not accept_inactive_accs:
+                self._press_cancel()
+                return _get_dialog_text(self._sess.ActiveWindow)
+
+        elif self._is_popup_dialog("is not current"):
+            self._close_popup_dialog(confirm = True)
+
+            if not accept_outdated_vols:
+                self._go_to_start_window()
+                return _get_dialog_text(self._sess.ActiveWindow)
+
+        # handle status bar messages
+        status_msg = self._stat_bar.Text
+
+        for kwd, msg_type in _STATUS_KEYWORDS:
+            if kwd in status_msg:
+                return (msg_type, status_msg)
+
+        return ("I", "Agreement found and opened.")
+
+    def _get_sales_volumes(self) -> tuple:
+        """Returns a tuple of sales volumes of an agreement."""
+
+        self._display_sales_volume()
+
+        if self._is_popup_dialog("is marked for deletion"):
+            self._close_popup_dialog(confirm = True)
+
+        _scroll_to_bottom(self._main_wnd.FindById("usr"))
+
+        color_yellow = 3
+        first_text = None
+        last_text = None
+
+        # only the first and the last of the matching
+        # labels hold the amounts that are returned
+        for lbl in self._main_wnd.findAllByName("", "GuiLabel"):
+
+            if lbl.ColorIndex != color_yellow:
+                continue
+            if lbl.ColorIntensified:
+                continue
+
+            text = lbl.Text
+            stripped = text.strip()
+
+            if stripped == "":
+                continue
+            if text.isalpha():
+                continue
+
+            if first_text is None:
+                first_text = stripped
+
+            last_text = stripped
+
+        total = _convert_amount(first_text)
+        accruals = _convert_amount(last_text)
+
+        self._press_cancel()
+
+        return (total, accruals)
+
+    def _find_conditions_button(self) -> CDispatch:
+        """Returns the 'Conditions' button of an opened agreement."""
+
+        # the button has no fixed position on the toolbar
+        btn = next((btn for btn in self._tool_bar.Children if btn.Text == "Conditions"), None)
+
+        assert btn is not None, "Button 'Conditions' not found on the toolbar!"
+
+        return btn
+
+    def _scales_checked(self) -> bool:
+        """Checks if scales are marked for all
+        agreement conditions available. Returns
+        True, if all condition scales are checked.
+        """
+
+        self._find_conditions_button().press()
+
+        conditions = self._sess.FindById("wnd[1]/usr/cntlCUSTOM_CONTAINER/shellcont/shell")
+        condition_key = "SalOrg/SalOff/CustHier/Usage"
+        n_rows = conditions.RowCount
+        get_cell_value = conditions.GetCellValue
+
+        # the grid has no search method, so the key column is
+        # scanned until the first row with the key combination
+        row_idx = next((
+            idx for idx in range(n_rows)
+            if get_cell_value(idx, "GSTXT") == condition_key
+        ), n_rows)
+
+        assert row_idx != n_rows, "Condition key not found in the list!"
 
         conditions.SelectedRows = str(row_idx)
         conditions.SetCurrentCell(row_idx, "GSTXT")
         conditions.DoubleClickCurrentCell()
-        break
 
-    assert row_idx != conditions.RowCount, "Condition key not found in the list!"
+        tbl = self._main_wnd.FindByName("SAPMV13ATCTRL_FAST_ENTRY", "GuiTable")
+        col_idx = _get_column_index(tbl,  name = "RV13A-KOSTKZ")
+        is_unchecked = _exists_unchecked(tbl, col_idx)
+
+        self._press_back()
 
-    tbl = _main_wnd.FindByName("SAPMV13ATCTRL_FAST_ENTRY", "GuiTable")
-    col_idx = _get_column_index(tbl,  name = "RV13A-KOSTKZ")
-    is_unchecked = _exists_unchecked(tbl, col_idx)
+        if self._stat_bar.MessageType == "W":
+            self._press_enter()
 
-    _press_back()
+        self._press_cancel()
 
-    if _stat_bar.MessageType == "W":
-        _press_enter()
+        return not is_unchecked
 
-    _press_cancel()
+    def _get_agreement_status(self) -> str:
+        """Returns the status of an agreement."""
+        return self._main_wnd.FindById("usr/ctxtKONA-BOSTA").Text
 
-    return not is_unchecked
+    def start(self) -> None:
+        """Starts the VBO2 transaction.
 
-def _get_agreement_status() -> str:
-    """Returns the status of an agreement."""
-    return _main_wnd.FindById("usr/ctxtKONA-BOSTA").Text
+        Attempt to start VBO2 that is
+        already running is ignored.
+        """
 
-def start(sess: CDispatch) -> None:
-    """Starts the VBO2 transaction.
+        if self._running:
+            return
 
-    Attempt to start VBO2 that is
-    already running is ignored.
+        _log.info("Starting VBO2 ...")
+        self._sess.StartTransaction("VBO2")
+        self._running = True
+        _log.info("VBO2 running.")
 
-    Params:
-    ------
-    sess: A SAP GuiSession object.
-    """
+    def close(self) -> None:
+        """Closes a running VBO2 transaction.
 
-    global _sess
-    global _main_wnd
-    global _stat_bar
-    global _tool_bar
-    global _menu_bar
+        Attempt to close VBO2 when it
+        has not been started is ignored.
+        """
 
-    if _sess is not None:
-        return
+        _log.info("Closing VBO2 ...")
 
-    if sess is None:
-        raise UnboundLocalError("Argument 'sess' is unbound!")
+        if not self._running:
+            return
 
-    _log.info("Starting VBO2 ...")
+        self._sess.EndTransaction()
 
-    _sess = sess
-    _main_wnd = sess.FindById("wnd[0]")
-    _stat_bar = _main_wnd.FindById("sbar")
-    _tool_bar = _main_wnd.FindById("tbar[1]")
-    _menu_bar = _main_wnd.FindById("mbar")
+        if self._is_popup_dialog():
+            self._close_popup_dialog(confirm = True)
 
-    _sess.StartTransaction("VBO2")
+        self._running = False
+        self._needs_hard_reset = False
 
-    _log.info("VBO2 running.")
+        _log.info("VBO2 closed.")
 
-def close() -> None:
-    """Closes a running VBO2 transaction.
+    def settle_agreement(
+            self, num: int, thresh: float,
+            accept_inactive_accs: bool = False,
+            accept_outdated_vols: bool = False
+        ) -> SettleResult:
+        """Creates the final settlement for open agreement.
 
-    Attempt to close VBO2 when it
-    has not been started is ignored.
-    """
+        Params:
+        -------
+        num:
+            Agreement number.
 
-    _log.info("Closing VBO2 ...")
+        thresh:
+            Threshod for open accroals amount under which agreements are settled.
 
-    global _sess
-    global _main_wnd
-    global _stat_bar
-    global _tool_bar
-    global _menu_bar
+        accept_inactive_accs
+            If True, then any warnings associated with customer
+            accounts that are 'marked for deletion' are ignored.
+            If False, then no agreement settlement is performed.
 
-    if _sess is None:
-        return
+        accept_outdated_vols:
+            If True, then any warnings associated with outdated
+            sales volumes are ignored. If False, then no agreement
+            settlement is performed.
 
-    _sess.EndTransaction()
+        Returns:
+        --------
+        Settlement result with attributes:
+            - open_value: Open amount value (float).
+            - open_accruals: Open accruals amount (float)
+            - document_number: Number of the accounting document (int).
+            - document_type: Type of the accounting document (str):
+                                "memo_request" = Request for issung a credit memo.
+                                "credit_memo" = Credit memo issued based on the memo request.
+            - message: Processing result message (str).
+            - message_type: Type of the processing result message (str):
+                                "I" = Information
+                                "W" = Warning
+                                "E" = Error
+        Raises:
+        -------
+        TransactionClosedError:
+            When attempting to use the procedure
+            before starting the transaction.
+        """
 
-    if _is_popup_dialog():
-        _close_popup_dialog(confirm = True)
+        if not self._running:
+            raise TransactionClosedError(
+                "Attempt to perform an operation "
+                "on a closed trasnsaction!")
 
-    _sess = None
-    _main_wnd = None
-    _stat_bar = None
-    _tool_bar = None
-    _menu_bar = None
+        result = SettleResult()
 
-    _log.info("VBO2 closed.")
+        if self._prepare_agreement(result, num, accept_inactive_accs, accept_outdated_vols):
+            if self._evaluate_open_values(result, thresh):
+                self._finalize(result)
 
-def settle_agreement(
-        num: int, thresh: float,
-        accept_inactive_accs: bool = False,
-        accept_outdated_vols: bool = False
-    ) -> dict:
-    """Creates the final settlement for open agreement.
+        self.reset_between_agreements()
 
-    Params:
-    -------
-    num:
-        Agreement number.
-
-    thresh:
-        Threshod for open accroals amount under which agreements are settled.
-
-    accept_inactive_accs
-        If True, then any warnings associated with customer
-        accounts that are 'marked for deletion' are ignored.
-        If False, then no agreement settlement is performed.
-
-    accept_outdated_vols:
-        If True, then any warnings associated with outdated
-        sales volumes are ignored. If False, then no agreement
-        settlement is performed.
-
-    Returns:
-    --------
-    Settlement result:
-        - "open_value": Open amount value (float).
-        - "open_accruals": Open accruals amount (float)
-        - "document_number": Number of the accounting document (int).
-        - "document_type": Type of the accounting document (str):
-                            "memo_request" = Request for issung a credit memo.
-                            "credit_memo" = Credit memo issued based on the memo request.
-        - "message": Processing result message (str).
-        - "message_type": Type of the processing result message (str):
-                            "I" = Information
-                            "W" = Warning
-                            "E" = Error
-    Raises:
-    -------
-    TransactionClosedError:
-        When attempting to use the procedure
-        before starting the transaction.
-    """
+        return result
 
-    if _sess is None:
-        raise TransactionClosedError(
-            "Attempt to perform an operation "
-            "on a closed trasnsaction!")
+    def reset_between_agreements(self) -> None:
+        """Prepares the initial window for the next agreement.
 
-    result = {
-        "open_value": None,
-        "open_accruals": None,
-        "document_number": None,
-        "document_type": None,
-        "message": None,
-        "message_type": None
-    }
+        VBO2 is restarted only if the previous agreement has been
+        opened, so that the object references are reset. Otherwise,
+        any lingering popup is dismissed and the input field cleared.
+        """
 
-    msg_type, msg = _find(num, accept_inactive_accs, accept_outdated_vols)
+        if self._needs_hard_reset:
+            self._go_to_start_window()
+            self._needs_hard_reset = False
+            return
 
-    if msg_type != "I":
+        while self._is_popup_dialog():
+            self._press_cancel()
+
+        self._clear_input_field()
+
+    def _prepare_agreement(
+            self, result: SettleResult, num: int,
+            accept_inactive_accs: bool, accept_outdated_vols: bool) -> bool:
+        """Opens an agreement. Returns True if the agreement is opened
+        for settlement, False if the result is already final.
+        """
+
+        msg_type, msg = self._find(num, accept_inactive_accs, accept_outdated_vols)
+
+        if msg_type == "I":
+            self._needs_hard_reset = True
+            return True
 
-        result.update({"message": msg, "message_type": msg_type})
+        result.message = msg
+        result.message_type = msg_type
 
         if msg_type == "W":
 
-            num, msg = _get_document_number("memo")
-            open_val, open_accr = _get_sales_volumes()
-            result.update({"open_value": open_val, "open_accruals": open_accr})
+            # the agreement is opened in the display mode
+            self._needs_hard_reset = True
 
-            result.update({
-                "document_type": "credit_memo",
-                "document_number": num,
-                "message": result["message"] + " " + msg,
-                "message_type": msg_type
-            })
+            doc_num, doc_msg = self._get_document_number("memo")
+            open_val, open_accr = self._get_sales_volumes()
 
-        _go_to_start_window()
-        _clear_input_field()
+            result.open_value = open_val
+            result.open_accruals = open_accr
+            result.document_type = "credit_memo"
+            result.document_number = doc_num
+            result.message = msg + " " + doc_msg
 
-        return result
+        return False
 
-    open_val, open_accr = _get_sales_volumes()
-    result.update({"open_value": open_val, "open_accruals": open_accr})
+    def _evaluate_open_values(self, result: SettleResult, thresh: float) -> bool:
+        """Checks the open values and the status of an opened agreement.
+        Returns True if the agreement can be settled, False if not.
+        """
 
-    status = _get_agreement_status()
+        open_val, open_accr = self._get_sales_volumes()
+        result.open_value = open_val
+        result.open_accruals = open_accr
 
-    if status in ("C", "D"):
-        num, msg = _get_document_number("memo")
-        _go_to_start_window()
-        result.update({
-            "document_type": "credit_memo",
-            "document_number": num,
-            "message_type": "E",
-            "message": f"The agreement status '{status}' does not " \
-                       f"permit creating the final settlement! {msg}"
-        })
+        status = self._get_agreement_status()
 
-        return result
+        if status in ("C", "D"):
+            num, msg = self._get_document_number("memo")
+            result.document_type = "credit_memo"
+            result.document_number = num
+            result.message_type = "E"
+            result.message = f"The agreement status '{status}' does not " \
+                             f"permit creating the final settlement! {msg}"
 
-    if open_val != 0:
-        _go_to_start_window()
-        result.update({
-            "message": "Could not settle the agreement! Open value is not 0 EUR.",
-            "message_type": "E"
-        })
+            return False
 
-        return result
+        if open_val != 0:
+            result.message = "Could not settle the agreement! Open value is not 0 EUR."
+            result.message_type = "E"
 
-    # cap the threshold to a valid
-    # bottom if negatives are used
-    thresh = max(0.01, thresh)
+            return False
 
-    if abs(open_accr) >= thresh and not _scales_checked():
-        _go_to_start_window()
-        err_msg = "Could not settle the agreement! The provision " \
-                  "open value is under the specified threshold " \
-                 f"{thresh} EUR and scales are unchecked!"
+        # cap the threshold to a valid
+        # bottom if negatives are used
+        thresh = max(0.01, thresh)
 
-        result.update({
-            "message_type": "E",
-            "message": err_msg
-        })
+        if abs(open_accr) >= thresh and not self._scales_checked():
+            err_msg = "Could not settle the agreement! The provision " \
+                      "open value is under the specified threshold " \
+                     f"{thresh} EUR and scales are unchecked!"
 
-        return result
+            result.message_type = "E"
+            result.message = err_msg
 
-    _press_settle()
+            return False
 
-    if _stat_bar.text == "Function code cannot be selected":
-        result.update({
-            "message_type": "E",
-            "message": "The 'Create Final Settlement ...' button not found!"
-        })
+        return True
 
-    if _is_popup_dialog("A credit memo request was created for settlement"):
+    def _finalize(self, result: SettleResult) -> None:
+        """Creates the final settlement of an opened agreement."""
 
-        _close_popup_dialog(confirm = True)
-        _press_save()
-        _reopen_agreement()
-        num, _ = _get_document_number("request")
+        self._press_settle()
 
-        _press_cancel()
-        _press_cancel()
-        _go_to_start_window()
+        if self._stat_bar.text == "Function code cannot be selected":
+            result.message_type = "E"
+            result.message = "The 'Create Final Settlement ...' button not found!"
 
-        result.update({
-            "document_type": "memo_request",
-            "document_number": num,
-            "message": "Agreement successfully settled.",
-            "message_type": "I"
-        })
+        if self._is_popup_dialog("A credit memo request was created for settlement"):
 
-        return result
+            self._close_popup_dialog(confirm = True)
+            self._press_save()
+
+            if not self._reopen_agreement():
+                result.message_type = "E"
+                result.message = "The agreement was settled, but it's still being " \
+                                f"processed after {_REOPEN_TIMEOUT:.0f} seconds! The " \
+                                 "credit memo request must be updated manually."
+                return
+
+            num, _ = self._get_document_number("request")
+
+            self._press_cancel()
+            self._press_cancel()
 
-    err_msg = _get_dialog_text(_sess.ActiveWindow)
+            result.document_type = "memo_request"
+            result.document_number = num
+            result.message = "Agreement successfully settled."
+            result.message_type = "I"
 
-    if "see next warning message" in err_msg:
-        _press_enter()
-        err_msg = _get_dialog_text(_sess.ActiveWindow)
+            return
 
-    result.update({
-        "message_type": "E",
-        "message": err_msg
-    })
+        err_msg = _get_dialog_text(self._sess.ActiveWindow)
 
-    if _is_popup_dialog():
-        _close_popup_dialog(confirm = True)
+        if "see next warning message" in err_msg:
+            self._press_enter()
+            err_msg = _get_dialog_text(self._sess.ActiveWindow)
 
-    _go_to_start_window()
+        result.message_type = "E"
+        result.message = err_msg
+
+        if self._is_popup_dialog():
+            self._close_popup_dialog(confirm = True)
+
+def start(sess: CDispatch) -> None:
+    """Starts the VBO2 transaction.
+
+    Attempt to start VBO2 that is
+    already running is ignored.
+
+    Params:
+    ------
+    sess: A SAP GuiSession object.
+    """
+
+    global _session
+
+    if _session is not None:
+        return
+
+    _session = Vbo2Session(sess)
+    _session.start()
+
+def close() -> None:
+    """Closes a running VBO2 transaction.
+
+    Attempt to close VBO2 when it
+    has not been started is ignored.
+    """
+
+    global _session
+
+    if _session is None:
+        return
+
+    _session.close()
+    _session = None
+
+def settle_agreement(
+        num: int, thresh: float,
+        accept_inactive_accs: bool = False,
+        accept_outdated_vols: bool = False
+    ) -> SettleResult:
+    """Creates the final settlement for open agreement
+    in the VBO2 transaction started by start(). For
+    the params and the result, see the method
+    Vbo2Session.settle_agreement().
+
+    Raises:
+    -------
+    TransactionClosedError:
+        When attempting to use the procedure
+        before starting the transaction.
+    """
+
+    if _session is None:
+        raise TransactionClosedError(
+            "Attempt to perform an operation "
+            "on a closed trasnsaction!")
 
-    return result
+    return _session.settle_agreement(
+        num, thresh, accept_inactive_accs, accept_outdated_vols)
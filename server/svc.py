@@ -1,4 +1,4 @@
-# pylint: disable = C0103, C0301, W0703, W1203
+# pylint: disable = C0103, C0301, W0703
 
 """
 The workflow finalization service completes all workflow
@@ -29,6 +29,7 @@ def main() -> int:
         - 1: Program fails during logger configuration.
         - 2: Program fails during the initialization phase.
         - 3: Program fails during the processing or reporting phase.
+        - 4: Program exits since another instance is running or the run lock can't be acquired.
     """
 
     try:
@@ -37,6 +38,16 @@ def main() -> int:
         print("CRITICAL: ", str(exc))
         return 1
 
+    try:
+        locked = ctrlr.acquire_run_lock()
+    except Exception as exc:
+        log.critical("Could not open the run lock file: %s", exc)
+        return 4
+
+    if not locked:
+        log.critical("Another instance of the application is already running!")
+        return 4
+
     log.info("=== Initialization ===")
 
     try:
@@ -57,8 +68,8 @@ def main() -> int:
             return 0
 
         for batch_name, data in batches.items():
-            log.info(f"=== Processing data batch '{batch_name}' ===")
-            ctrlr.finalize_workflow(sess, data["credit_memos"])
+            log.info("=== Processing data batch '%s' ===", batch_name)
+            ctrlr.finalize_workflow(sess, data["credit_memos"], batch_name)
             ctrlr.remove_data_batch(batch_name)
             log.info("=== Data batch processed ===\n")
 
@@ -79,6 +90,6 @@ def main() -> int:
 
 if __name__ == "__main__":
     ret_code = main()
-    log.info(f"=== System shutdown with return code: {ret_code} ===")
+    log.info("=== System shutdown with return code: %d ===", ret_code)
     logging.shutdown()
     sys.exit(ret_code)